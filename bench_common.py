@@ -0,0 +1,54 @@
+# file: bench_common.py
+# Outils communs aux scripts bench_*.py et aux tests : import de detect_sstv dans un dossier
+# de travail jetable (sstv_stats.db, user_data et fichiers suivis n'y touchent pas le dépôt)
+
+import os
+import sys
+import logging
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SSTV_CHANNEL_ID = 1001
+STATS_CHANNEL_ID = 1002
+
+def load_bot(workdir, **env):
+    # À appeler une seule fois par processus : detect_sstv lit sa configuration à l'import
+    folder = os.path.join(workdir, "watched")
+    os.makedirs(folder, exist_ok=True)
+    os.environ.update({
+        "DISCORD_TOKEN": "bench",
+        "WATCHED_FOLDER": folder,
+        "SSTV_CHANNEL_ID": str(SSTV_CHANNEL_ID),
+        "STATS_CHANNEL_ID": str(STATS_CHANNEL_ID),
+        "WSPR_FILE_PATH": os.path.join(workdir, "ALL_WSPR.TXT"),
+        "DECODED_FILE_PATH": os.path.join(workdir, "decoded.txt"),
+        "SDR_PROBE_HOSTS": "127.0.0.1",
+        "METRICS_PORT": "0",
+    })
+    os.environ.update(env)
+    for path in (os.environ["WSPR_FILE_PATH"], os.environ["DECODED_FILE_PATH"]):
+        if not os.path.exists(path):
+            open(path, "w").close()
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    import detect_sstv
+    logging.getLogger().setLevel(logging.WARNING)
+    return detect_sstv
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+def ms(value):
+    return "-" if value is None else f"{value * 1000:.1f} ms"
@@ -0,0 +1,95 @@
+# file: bench_feeds.py
+# Rattrapage des journaux WSPR/FT8 de taille réelle : débit de TailReader + analyse par tour
+# (plafonné à TailReader.MAX_READ_BYTES) et retard de la boucle asyncio pendant le rattrapage,
+# avec read_batch exécuté dans la boucle (ancien comportement) ou dans un thread (process_feed).
+#
+#   python bench_feeds.py --lines 1000000
+
+import argparse
+import asyncio
+import os
+import random
+import string
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bench_common import load_bot, summarize, ms
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de lecture des journaux WSPR et FT8")
+    parser.add_argument("--lines", type=int, default=1_000_000, help="lignes par journal")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+def callsign(rng):
+    prefix = rng.choice(("F4", "F5", "DL", "G4", "K1", "W2", "JA1", "VK2", "EA3", "ON4"))
+    return prefix + "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(2, 3)))
+
+def grid(rng):
+    return rng.choice(string.ascii_uppercase[:18]) + rng.choice(string.ascii_uppercase[:18]) + f"{rng.randint(0, 99):02d}"
+
+def write_logs(workdir, count, rng):
+    # Horodatages croissants, comme un récepteur qui tourne depuis des semaines
+    start = datetime.now() - timedelta(seconds=count * 2)
+    wspr = os.path.join(workdir, "ALL_WSPR.big")
+    ft8 = os.path.join(workdir, "decoded.big")
+    with open(wspr, "w") as fw, open(ft8, "w") as ff:
+        for i in range(count):
+            t = start + timedelta(seconds=i * 2)
+            fw.write(f"{t:%y%m%d} {t:%H%M} {rng.randint(-30, 5)}  0.{rng.randint(0, 9)}  14.0971{rng.randint(0, 99):02d} "
+                     f"{callsign(rng)} {grid(rng)} {rng.choice((23, 30, 37))}\n")
+            ff.write(f"{t:%y%m%d_%H%M%S} 14.074 Rx -{rng.randint(1, 24)} 0.1 {rng.randint(200, 2800)} "
+                     f"CQ {callsign(rng)} {grid(rng)} FT8\n")
+    return {"wspr": (wspr, "parse_wspr_line"), "ft8": (ft8, "parse_decoded_line")}
+
+async def measure_lag(stop, lags, interval=0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - start - interval))
+
+async def catch_up(d, path, parser, offload):
+    feed = d.DecoderFeed(f"bench-{os.path.basename(path)}-{offload}", path, getattr(d, parser), 1, None, None)
+    feed.reader.inode, feed.reader.offset = os.stat(path).st_ino, 0
+    stop, lags, ticks = asyncio.Event(), [], []
+    monitor = asyncio.create_task(measure_lag(stop, lags))
+    await asyncio.sleep(0.02)
+    loop = asyncio.get_running_loop()
+    spots = 0
+    started = time.perf_counter()
+    while True:
+        start = time.perf_counter()
+        batch, cursor = await loop.run_in_executor(None, feed.read_batch) if offload else feed.read_batch()
+        if not batch:
+            break
+        feed.reader.advance(cursor)
+        ticks.append(time.perf_counter() - start)
+        spots += len(batch)
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    return spots, elapsed, summarize(ticks), summarize(lags)
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="sstv-bench-feeds-") as workdir:
+        d = load_bot(workdir)
+        logs = write_logs(workdir, args.lines, rng)
+        cap = d.TailReader.MAX_READ_BYTES / 2 ** 20
+        print(f"Plafond par tour : {cap:.0f} Mo")
+        print(f"{'journal':<7}{'Mo':>7}{'read_batch':>12}{'spots':>10}{'spots/s':>10}{'tours':>7}{'tour p50':>11}{'tour max':>11}{'lag max':>11}")
+        for name, (path, parser) in logs.items():
+            size = os.path.getsize(path) / 2 ** 20
+            for offload in (False, True):
+                spots, elapsed, ticks, lags = asyncio.run(catch_up(d, path, parser, offload))
+                mode = "thread" if offload else "boucle"
+                print(f"{name:<7}{size:>7.1f}{mode:>12}{spots:>10}{spots / elapsed:>10.0f}{ticks['count']:>7}"
+                      f"{ms(ticks['p50']):>11}{ms(ticks['max']):>11}{ms(lags['max']):>11}")
+        d.db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# file: bench_fts.py
+# Recherche /infosear sur une grosse base privée : fetch_logbook_page avec l'index FTS5
+# et avec le repli LIKE (FTS5_AVAILABLE forcé à False), première page et pages suivantes.
+#
+#   python bench_fts.py --rows 500000 --repeat 10
+
+import argparse
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+
+from bench_common import load_bot, summarize, ms
+
+MODES = ("FT8", "FT4", "JT65", "WSPR")
+WORDS = ("CQ", "DX", "RR73", "73", "TNX", "QSL", "POTA", "SOTA", "TEST", "UP")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de fetch_logbook_page avec et sans FTS5")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=5, help="pages parcourues par curseur après la première")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+def callsign(rng):
+    prefix = rng.choice(("F4", "F5", "F8", "DL", "G4", "K1", "W2", "JA1", "VK2", "EA3", "ON4", "I2"))
+    return prefix + "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(2, 3)))
+
+def build_logbook(conn, count, rng, batch=50_000):
+    calls = [callsign(rng) for _ in range(20_000)]
+    for start in range(0, count, batch):
+        rows = []
+        for i in range(start, min(count, start + batch)):
+            grid = rng.choice(string.ascii_uppercase[:18]) + rng.choice(string.ascii_uppercase[:18]) + f"{rng.randint(0, 99):02d}"
+            reste = f"{rng.choice(WORDS)} {rng.choice(calls)} {grid} {rng.randint(-24, 10):+d}"
+            rows.append((rng.choice(MODES), f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", rng.choice(calls), reste))
+        conn.executemany("INSERT INTO ft_messages (type, date, call, reste) VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    return calls
+
+def browse(d, conn, query, pages):
+    # Première page puis "Suivant" comme le ferait la vue /infosear
+    first = time.perf_counter()
+    page = d.fetch_logbook_page(conn, "ft", query)
+    first = time.perf_counter() - first
+    following = []
+    for _ in range(pages):
+        if len(page) < d.SEARCH_PAGE_SIZE:
+            break
+        start = time.perf_counter()
+        page = d.fetch_logbook_page(conn, "ft", query, after=page[-1][0])
+        following.append(time.perf_counter() - start)
+    return first, following
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="sstv-bench-fts-") as workdir:
+        d = load_bot(workdir)
+        if not d.FTS5_AVAILABLE:
+            raise SystemExit("SQLite est compilé sans FTS5 : rien à comparer")
+        path = os.path.join(workdir, "logbook.db")
+        conn = sqlite3.connect(path)
+        d.migrate_user_db(conn)
+
+        start = time.perf_counter()
+        calls = build_logbook(conn, args.rows, rng)
+        print(f"{args.rows} lignes ft_messages (index FTS5 tenu par triggers) en {time.perf_counter() - start:.1f} s, "
+              f"{os.path.getsize(path) / 2 ** 20:.0f} Mo")
+
+        queries = {
+            "indicatif": calls[0],
+            "préfixe": calls[1][:3],
+            "mot courant": "CQ",
+            "deux mots": f"POTA {calls[2]}",
+            "absent": "ZZ9ZZZ",
+        }
+        results = {}
+        for fts in (True, False):
+            d.FTS5_AVAILABLE = fts
+            for label, query in queries.items():
+                firsts, following = [], []
+                for _ in range(args.repeat):
+                    first, more = browse(d, conn, query, args.pages)
+                    firsts.append(first)
+                    following.extend(more)
+                results[fts, label] = summarize(firsts), summarize(following)
+        d.FTS5_AVAILABLE = True
+        conn.close()
+
+    # Les deux chemins ne renvoient pas exactement les mêmes lignes : FTS5 cherche des mots
+    # (préfixes), LIKE des sous-chaînes ; les deux sont paginés sur id
+    print(f"{'requête':<14}{'':<6}{'1re page p50':>14}{'p95':>12}{'suivantes p50':>16}{'p95':>12}")
+    for label, query in queries.items():
+        for fts in (True, False):
+            first, following = results[fts, label]
+            print(f"{label:<14}{'FTS5' if fts else 'LIKE':<6}{ms(first['p50']):>14}{ms(first['p95']):>12}"
+                  f"{ms(following['p50']):>16}{ms(following['p95']):>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# file: bench_import.py
+# /import sur de gros journaux : génération d'un ADIF et d'un ALL.TXT de WSJT-X, puis mesure
+# séparée de la lecture (iter_import_rows) et de l'insertion par lots (insert_ft_rows),
+# dans une base vide puis en réimportant le même fichier (tout est doublon).
+#
+#   python bench_import.py --qsos 100000
+
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+
+from bench_common import load_bot
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de /import (ADIF et ALL.TXT)")
+    parser.add_argument("--qsos", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+def callsign(rng):
+    prefix = rng.choice(("F4", "F5", "F8", "DL", "G4", "K1", "W2", "JA1", "VK2", "EA3", "ON4", "I2"))
+    return prefix + "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(2, 3)))
+
+def grid(rng):
+    return rng.choice(string.ascii_uppercase[:18]) + rng.choice(string.ascii_uppercase[:18]) + f"{rng.randint(0, 99):02d}"
+
+def write_adif(path, count, rng):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Journal généré par bench_import.py\n<ADIF_VER:5>3.1.4 <PROGRAMID:6>WSJT-X <EOH>\n")
+        for i in range(count):
+            fields = {
+                "CALL": callsign(rng),
+                "GRIDSQUARE": grid(rng),
+                "MODE": rng.choice(("FT8", "FT8", "MFSK", "JT65")),
+                "SUBMODE": "FT4",
+                "RST_SENT": f"{rng.randint(-24, 10):+d}",
+                "RST_RCVD": f"{rng.randint(-24, 10):+d}",
+                "QSO_DATE": f"2024{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}",
+                "TIME_ON": f"{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}{rng.randint(0, 59):02d}",
+                "BAND": "20m",
+                "FREQ": f"14.{rng.randint(74000, 76999)}",
+                "COMMENT": rng.choice(("", "", "Très bon signal", "POTA F-0123")),
+            }
+            f.write(" ".join(f"<{k}:{len(v.encode())}>{v}" for k, v in fields.items() if v) + " <EOR>\n")
+
+def write_all_txt(path, count, rng):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            stamp = f"24{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}_{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}{rng.choice((0, 15, 30, 45)):02d}"
+            message = rng.choice((
+                f"CQ {callsign(rng)} {grid(rng)}",
+                f"CQ DX {callsign(rng)} {grid(rng)}",
+                f"{callsign(rng)} {callsign(rng)} {rng.randint(-24, 10):+d}",
+                f"{callsign(rng)} {callsign(rng)} RR73",
+            ))
+            mode = rng.choice(("FT8", "FT8", "FT4"))
+            f.write(f"{stamp}    14.074 Rx {mode:<6}{rng.randint(-24, 10):>4}  0.{rng.randint(0, 9)} {rng.randint(200, 2800):>4} {message}\n")
+
+def import_file(d, conn, path):
+    # Même découpage que /import : lecture d'un lot, puis une transaction par lot
+    parse = insert = 0.0
+    parsed = inserted = 0
+    rows = d.iter_import_rows(path)
+    while True:
+        start = time.perf_counter()
+        batch = list(itertools.islice(rows, d.IMPORT_BATCH_SIZE))
+        parse += time.perf_counter() - start
+        if not batch:
+            break
+        start = time.perf_counter()
+        inserted += d.insert_ft_rows(conn, batch)
+        conn.commit()
+        insert += time.perf_counter() - start
+        parsed += len(batch)
+    return parsed, inserted, parse, insert
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="sstv-bench-import-") as workdir:
+        d = load_bot(workdir)
+        files = {"ADIF": os.path.join(workdir, "log.adi"), "ALL.TXT": os.path.join(workdir, "ALL.TXT")}
+        write_adif(files["ADIF"], args.qsos, rng)
+        write_all_txt(files["ALL.TXT"], args.qsos, rng)
+
+        print(f"{'fichier':<9}{'passe':<10}{'Mo':>6}{'lus':>9}{'ajoutés':>9}{'lecture':>10}{'lignes/s':>11}{'insertion':>11}{'lignes/s':>11}")
+        for kind, path in files.items():
+            size = os.path.getsize(path) / 2 ** 20
+            conn = sqlite3.connect(os.path.join(workdir, f"{kind}.db"))
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            d.migrate_user_db(conn)
+            for label in ("vide", "doublons"):
+                parsed, inserted, parse, insert = import_file(d, conn, path)
+                print(f"{kind:<9}{label:<10}{size:>6.1f}{parsed:>9}{inserted:>9}{parse:>9.2f}s{parsed / parse:>11.0f}"
+                      f"{insert:>10.2f}s{parsed / insert:>11.0f}")
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# file: bench_quality.py
+# Mesure de quality_score sur de vraies images : temps par image (décodage et note séparés)
+# et distribution des notes, pour régler QUALITY_THRESHOLD sur ce que produit le récepteur.
+#
+#   python bench_quality.py                      (WATCHED_FOLDER et ARCHIVE_DIR de l'environnement)
+#   python bench_quality.py /srv/sstv /srv/archive --csv scores.csv
+
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from bench_common import load_bot, summarize, ms
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de quality_score sur un dossier d'images")
+    parser.add_argument("folders", nargs="*", help="dossiers à parcourir (défaut : WATCHED_FOLDER et ARCHIVE_DIR)")
+    parser.add_argument("--limit", type=int, default=0, help="nombre maximal d'images (0 = toutes)")
+    parser.add_argument("--csv", help="écrit fichier, dimensions, temps et note de chaque image")
+    return parser.parse_args()
+
+def find_images(folders, limit):
+    paths = []
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(IMAGE_EXTENSIONS))
+    paths.sort()
+    return paths[:limit] if limit else paths
+
+def histogram(scores, step=10):
+    bins = [0] * (100 // step)
+    for score in scores:
+        bins[min(len(bins) - 1, int(score // step))] += 1
+    width = max(bins) or 1
+    for i, count in enumerate(bins):
+        print(f"  {i * step:>3}-{i * step + step:<3} {count:>6}  {'#' * round(40 * count / width)}")
+
+def main():
+    args = parse_args()
+    # Lus avant load_bot, qui remplace WATCHED_FOLDER par un dossier temporaire
+    folders = args.folders or [f for f in (os.getenv("WATCHED_FOLDER", "/tmp"), os.getenv("ARCHIVE_DIR")) if f]
+    folders = [os.path.abspath(f) for f in folders]
+    paths = find_images(folders, args.limit)
+    csv_path = os.path.abspath(args.csv) if args.csv else None
+    if not paths:
+        raise SystemExit(f"Aucune image dans {', '.join(folders)}")
+
+    with tempfile.TemporaryDirectory(prefix="sstv-bench-quality-") as workdir:
+        d = load_bot(workdir)
+        if d.Image is None or d.np is None:
+            raise SystemExit("quality_score a besoin de Pillow et NumPy")
+
+        rows = []
+        for path in paths:
+            start = time.perf_counter()
+            try:
+                with d.Image.open(path) as img:
+                    rgb = img.convert("RGB")
+            except OSError as e:
+                print(f"Illisible, ignorée : {path} ({e})")
+                continue
+            decoded = time.perf_counter()
+            score = d.quality_score(rgb)
+            rows.append((path, rgb.size, decoded - start, time.perf_counter() - decoded, score))
+        d.db.close()
+
+    if not rows:
+        raise SystemExit("Aucune image lisible")
+    decode = summarize([row[2] for row in rows])
+    scoring = summarize([row[3] for row in rows])
+    scores = [row[4] for row in rows]
+    pixels = sum(w * h for _, (w, h), _, _, _ in rows) / len(rows)
+
+    print(f"{len(rows)} images dans {', '.join(folders)} ({pixels / 1e3:.0f} kpx en moyenne)")
+    print(f"{'étape':<16}{'p50':>12}{'p95':>12}{'max':>12}")
+    for name, stats in (("décodage", decode), ("quality_score", scoring)):
+        print(f"{name:<16}{ms(stats['p50']):>12}{ms(stats['p95']):>12}{ms(stats['max']):>12}")
+    below = sum(1 for score in scores if score < d.QUALITY_THRESHOLD)
+    print(f"Notes : min {min(scores):g}, médiane {sorted(scores)[len(scores) // 2]:g}, max {max(scores):g}, "
+          f"{below} sous QUALITY_THRESHOLD={d.QUALITY_THRESHOLD:g} ({100 * below / len(scores):.0f} %)")
+    histogram(scores)
+
+    if csv_path:
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("file", "width", "height", "decode_ms", "score_ms", "score"))
+            for path, (w, h), decode_s, score_s, score in rows:
+                writer.writerow((path, w, h, f"{decode_s * 1000:.2f}", f"{score_s * 1000:.2f}", score))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,497 @@
+# file: bench_replay.py
+# Banc de mesure de bout en bout : faux backend Discord (latence et 429 configurables),
+# producteur OpenWebRX synthétique (images SSTV, lignes WSPR/FT8) et vraies boucles du bot.
+#
+#   python bench_replay.py --duration 120 --images-per-min 30 --wspr-per-min 120 --json run.json
+#   python bench_replay.py --prefill 50000 --watch-mode both   (polling contre inotify sur un gros dossier)
+
+import os
+import sys
+import re
+import subprocess
+import time
+import json
+import zlib
+import struct
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import itertools
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import psutil
+
+from bench_common import load_bot, summarize, SSTV_CHANNEL_ID, STATS_CHANNEL_ID
+
+BOT_USER_ID = 1
+HUMAN_USER_ID = 2
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rejoue une charge synthétique à travers detect_sstv.py")
+    parser.add_argument("--duration", type=float, default=60, help="durée de production (s)")
+    parser.add_argument("--drain", type=float, default=30, help="attente après la production pour vider les files (s)")
+    parser.add_argument("--images-per-min", type=float, default=20)
+    parser.add_argument("--burst", type=int, default=0, help="images écrites d'un coup au départ (temps de vidage rapporté)")
+    parser.add_argument("--image-size", default="320x256", help="LxH des PNG générés")
+    parser.add_argument("--wspr-per-min", type=float, default=60)
+    parser.add_argument("--ft8-per-min", type=float, default=120)
+    parser.add_argument("--react-ratio", type=float, default=0.5, help="part des posts SSTV qui reçoivent une réaction")
+    parser.add_argument("--react-delay", type=float, default=1.0, help="délai avant la réaction (s)")
+    parser.add_argument("--latency", type=float, default=0.08, help="latence moyenne d'un appel API (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probabilité d'un 429 aléatoire par appel")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After des 429 aléatoires (s)")
+    parser.add_argument("--no-enforce-limits", action="store_true", help="ne pas appliquer les limites 5 msg/5 s et 1 réaction/250 ms")
+    parser.add_argument("--watch-mode", choices=("poll", "auto", "both"), default="poll",
+                        help="both = un run par mode dans des sous-processus, puis comparaison")
+    parser.add_argument("--prefill", type=int, default=0, help="fichiers SSTV déjà postés placés dans le dossier avant le départ")
+    parser.add_argument("--receivers", type=int, default=1, help="nombre de récepteurs simulés (RECEIVERS_FILE si > 1)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="écrit le rapport dans ce fichier pour comparer les runs")
+    parser.add_argument("--metrics", action="store_true", help="affiche aussi les métriques internes du bot")
+    return parser.parse_args()
+
+class Recorder:
+    def __init__(self):
+        self.written = {}  # clé (fichier ou indicatif) -> instant d'écriture (time.time)
+        self.delivered = {}  # clé -> latence de bout en bout
+        self.kinds = {}
+        self.reaction_latency = []
+        self.stats_edits = 0
+        self.api_calls = 0
+        self.ratelimits = 0
+        self.loop_lag = []
+        self.rss = []
+        self.cpu_seconds = 0.0
+        self.burst = []
+
+    def produced(self, kind, key):
+        self.written[key] = time.time()
+        self.kinds[key] = kind
+
+    def posted(self, key):
+        if key in self.written and key not in self.delivered:
+            self.delivered[key] = time.time() - self.written[key]
+
+    def burst_drain(self):
+        # Temps jusqu'au post de la dernière image de la rafale, None si elle n'est pas vidée
+        if not self.burst or any(key not in self.delivered for key in self.burst):
+            return None
+        return max(self.delivered[key] for key in self.burst)
+
+    def latencies(self, kind):
+        return [lat for key, lat in self.delivered.items() if self.kinds[key] == kind]
+
+# --- Faux Discord ------------------------------------------------------------------
+
+class FakeMessage:
+    def __init__(self, channel, message_id, content=None, embed=None):
+        self.channel = channel
+        self.id = message_id
+        self.content = content
+        self.embed = embed
+        self.author = channel.backend.user
+        self.attachments = []
+        self.deleted = False
+
+    async def edit(self, content=None, **kwargs):
+        await self.channel.backend.call(self.channel.id, "edit")
+        self.content = content
+        if self.channel.id == STATS_CHANNEL_ID:
+            self.channel.backend.recorder.stats_edits += 1
+        return self
+
+    def to_reference(self, *, fail_if_not_exists=True):
+        return SimpleNamespace(message_id=self.id, channel_id=self.channel.id, fail_if_not_exists=fail_if_not_exists)
+
+    async def add_reaction(self, emoji):
+        await self.channel.backend.call(self.channel.id, "react")
+
+    async def clear_reactions(self):
+        await self.channel.backend.call(self.channel.id, "edit")
+
+    async def delete(self):
+        await self.channel.backend.call(self.channel.id, "edit")
+        self.deleted = True
+
+class FakeChannel:
+    def __init__(self, backend, channel_id):
+        self.backend = backend
+        self.id = channel_id
+        self.messages = {}
+
+    async def send(self, content=None, *, embed=None, file=None, **kwargs):
+        if file is not None:
+            file.close()
+        await self.backend.call(self.id, "send")
+        message = FakeMessage(self, next(self.backend.ids), content, embed)
+        self.messages[message.id] = message
+        self.backend.on_message(message)
+        return message
+
+    def get_partial_message(self, message_id):
+        return self.messages.get(message_id) or FakeMessage(self, message_id)
+
+    async def fetch_message(self, message_id):
+        await self.backend.call(self.id, "fetch")
+        return self.messages[message_id]
+
+    async def history(self, limit=100):
+        await self.backend.call(self.id, "fetch")
+        for message_id in sorted(self.messages, reverse=True)[:limit]:
+            yield self.messages[message_id]
+
+class FakeDiscord:
+    # Reproduit ce que discord.py fait d'un 429 : avertissement sur le logger discord.http
+    # puis nouvel essai après Retry-After. Les limites par salon sont appliquées comme
+    # le ferait Discord (5 messages / 5 s, une réaction / 250 ms).
+    LIMITS = {"send": (5, 5.0), "react": (1, 0.25)}
+
+    def __init__(self, args, recorder, rng):
+        self.args = args
+        self.recorder = recorder
+        self.rng = rng
+        self.ids = itertools.count(10 ** 6)
+        self.user = SimpleNamespace(id=BOT_USER_ID, name="bench-bot")
+        self.channels = {}
+        self.windows = {}
+        self.log = logging.getLogger("discord.http")
+        self.pending_reactions = set()
+
+    def channel(self, channel_id):
+        if channel_id not in self.channels:
+            self.channels[channel_id] = FakeChannel(self, channel_id)
+        return self.channels[channel_id]
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def retry_after(self, channel_id, kind):
+        if self.args.error_rate and self.rng.random() < self.args.error_rate:
+            return self.args.retry_after
+        if self.args.no_enforce_limits or kind not in self.LIMITS:
+            return 0
+        # Fenêtre fixe comme les seaux Discord : "count" appels jusqu'à X-RateLimit-Reset
+        count, period = self.LIMITS[kind]
+        now = time.monotonic()
+        window = self.windows.get((channel_id, kind))
+        if window is None or now >= window[0]:
+            window = self.windows[(channel_id, kind)] = [now + period, count]
+        if window[1] == 0:
+            return window[0] - now
+        window[1] -= 1
+        return 0
+
+    async def call(self, channel_id, kind):
+        while True:
+            self.recorder.api_calls += 1
+            await asyncio.sleep(self.args.latency * self.rng.uniform(0.5, 1.5))
+            retry_after = self.retry_after(channel_id, kind)
+            if not retry_after:
+                return
+            self.recorder.ratelimits += 1
+            self.log.warning(
+                "We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.",
+                "POST", f"/channels/{channel_id}/{kind}", retry_after
+            )
+            await asyncio.sleep(retry_after)
+
+    def on_message(self, message):
+        if message.content and "New SSTV Signal" in message.content:
+            match = re.search(r"\*\*File\*\*: `([^`]+)`", message.content)
+            if match:
+                self.recorder.posted(match.group(1))
+            if self.rng.random() < self.args.react_ratio:
+                task = asyncio.get_running_loop().create_task(self.react(message))
+                self.pending_reactions.add(task)
+                task.add_done_callback(self.pending_reactions.discard)
+        elif message.embed is not None:
+            for line in (message.embed.description or "").splitlines():
+                match = re.search(r"\[\*\*([^*]+)\*\*\]", line)
+                if match:
+                    self.recorder.posted(match.group(1))
+        elif message.content:
+            for call in re.findall(r"\[\*\*([^*]+)\*\*\]", message.content):
+                self.recorder.posted(call)
+
+    async def react(self, message):
+        await asyncio.sleep(self.args.react_delay)
+        payload = SimpleNamespace(
+            user_id=HUMAN_USER_ID,
+            emoji=self.rng.choice(("✅", "❌")),
+            message_author_id=BOT_USER_ID,
+            channel_id=message.channel.id,
+            message_id=message.id,
+        )
+        start = time.perf_counter()
+        await self.bot_module.on_raw_reaction_add(payload)
+        self.recorder.reaction_latency.append(time.perf_counter() - start)
+
+# --- Producteur OpenWebRX synthétique ---------------------------------------------
+
+def png_bytes(width, height, rng):
+    # Blocs de couleur unie : lignes bien corrélées (bonne note de qualité) et empreinte
+    # différente à chaque image, pour ne pas déclencher le dédoublonnage
+    cells = [[bytes(rng.randrange(256) for _ in range(3)) for _ in range(8)] for _ in range(8)]
+    block_w = -(-width // 8)
+    rows = []
+    for y in range(height):
+        cell_row = cells[y * 8 // height]
+        row = b"".join(cell * block_w for cell in cell_row)[:width * 3]
+        rows.append(b"\x00" + row)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"".join(rows), 6)) + chunk(b"IEND", b"")
+
+async def every(per_minute, deadline, produce):
+    if per_minute <= 0:
+        return
+    interval = 60.0 / per_minute
+    next_at = time.monotonic()
+    while next_at < deadline:
+        produce()
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+def append_line(path, line):
+    with open(path, "a") as f:
+        f.write(line + "\n")
+
+async def produce(args, recorder, rng, receivers):
+    # Les productions sont réparties à tour de rôle entre les récepteurs
+    width, height = (int(v) for v in args.image_size.split("x"))
+    deadline = time.monotonic() + args.duration
+    counter = itertools.count()
+    folders = itertools.cycle([r.watched_folder for r in receivers])
+    wspr_paths = itertools.cycle([r.wspr_feed.reader.path for r in receivers])
+    decoded_paths = itertools.cycle([r.decoded_feed.reader.path for r in receivers])
+
+    def image(folder=None):
+        name = f"SSTV-bench-{next(counter):05d}-14230.png"
+        data = png_bytes(width, height, rng)
+        recorder.produced("sstv", name)
+        with open(os.path.join(folder or next(folders), name), "wb") as f:
+            f.write(data)
+        return name
+
+    # Rafale : plusieurs images décodées en même temps, toutes vers le même salon
+    recorder.burst = [image(receivers[0].watched_folder) for _ in range(args.burst)]
+
+    def wspr():
+        now = datetime.now(timezone.utc)
+        call = f"W{next(counter):05d}"
+        recorder.produced("wspr", call)
+        append_line(next(wspr_paths), f"{now:%y%m%d} {now:%H%M} {rng.randint(-30, 5)}  0.{rng.randint(0, 9)}  14.0971{rng.randint(0, 99):02d} {call} FN42 37")
+
+    def ft8():
+        now = datetime.now(timezone.utc)
+        call = f"F{next(counter):05d}"
+        recorder.produced("ft8", call)
+        append_line(next(decoded_paths), f"{now:%y%m%d_%H%M%S} 14.074 Rx -{rng.randint(1, 24)} 0.1 {rng.randint(200, 2800)} {call} K1ABC FT8")
+
+    await asyncio.gather(
+        every(args.images_per_min, deadline, image),
+        every(args.wspr_per_min, deadline, wspr),
+        every(args.ft8_per_min, deadline, ft8),
+    )
+
+def prefill_folder(d, count):
+    # Dossier OpenWebRX qui a déjà beaucoup servi : fichiers marqués comme vus, comme après
+    # un redémarrage (seul l'index récent est rechargé en mémoire)
+    folder = d.receivers[0].watched_folder
+    rows = []
+    now = time.time()
+    for i in range(count):
+        name = f"SSTV-old-{i:06d}-14230.png"
+        path = os.path.join(folder, name)
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG")
+        st = os.stat(path)
+        rows.append((name, st.st_ino, int(st.st_mtime), now))
+    d.db.call(lambda conn: conn.executemany(
+        "INSERT OR REPLACE INTO seen_files (filename, inode, mtime, seen_at) VALUES (?, ?, ?, ?)", rows
+    ))
+    d.seen_index.cache.clear()
+    d.seen_index.load_recent()
+
+async def sample_process(recorder, stop, interval=0.1):
+    loop = asyncio.get_running_loop()
+    process = psutil.Process()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        recorder.loop_lag.append(max(0.0, loop.time() - start - interval))
+        recorder.rss.append(process.memory_info().rss)
+
+# --- Exécution ----------------------------------------------------------------------
+
+async def run(args, d, recorder, rng):
+    backend = FakeDiscord(args, recorder, rng)
+    backend.bot_module = d
+    backend.channel(STATS_CHANNEL_ID)
+    for receiver in d.receivers:
+        for channel_id in (receiver.sstv_channel_id, receiver.wspr_feed.channel_id, receiver.decoded_feed.channel_id):
+            backend.channel(channel_id)
+    d.bot.get_channel = backend.get_channel
+    d.bot._connection.user = backend.user
+    d.bot.ws = SimpleNamespace(latency=args.latency)
+    d.WATCH_MODE = args.watch_mode
+
+    stop = asyncio.Event()
+    sampler = asyncio.get_running_loop().create_task(sample_process(recorder, stop))
+    await d.start_folder_watcher()
+    loops = [d.update_stats_message, d.monitor_wspr_file, d.monitor_decoded_file]
+    for loop in loops:
+        loop.start()
+
+    started = time.perf_counter()
+    cpu_start = sum(psutil.Process().cpu_times()[:2])
+    await produce(args, recorder, rng, d.receivers)
+    produced_for = time.perf_counter() - started
+
+    drain_until = time.monotonic() + args.drain
+    while time.monotonic() < drain_until and len(recorder.delivered) < len(recorder.written):
+        await asyncio.sleep(0.25)
+    if backend.pending_reactions:
+        await asyncio.wait(set(backend.pending_reactions), timeout=max(0.0, drain_until - time.monotonic()) + 5)
+    elapsed = time.perf_counter() - started
+    recorder.cpu_seconds = sum(psutil.Process().cpu_times()[:2]) - cpu_start
+
+    stop.set()
+    await sampler
+    for loop in loops + [d.monitor_folder]:
+        loop.cancel()
+    for task in d.sstv_consumer_tasks:
+        task.cancel()
+    for receiver in d.receivers:
+        if receiver.watcher is not None:
+            receiver.watcher.stop()
+    return produced_for, elapsed
+
+def report(args, recorder, produced_for, elapsed):
+    result = {
+        "config": vars(args),
+        "elapsed_s": elapsed,
+        "produced": {kind: sum(1 for k in recorder.kinds.values() if k == kind) for kind in ("sstv", "wspr", "ft8")},
+        "delivered": {kind: len(recorder.latencies(kind)) for kind in ("sstv", "wspr", "ft8")},
+        "throughput_per_s": {kind: len(recorder.latencies(kind)) / produced_for for kind in ("sstv", "wspr", "ft8")},
+        "latency_s": {kind: summarize(recorder.latencies(kind)) for kind in ("sstv", "wspr", "ft8")},
+        "reaction_latency_s": summarize(recorder.reaction_latency),
+        "event_loop_lag_s": summarize(recorder.loop_lag),
+        "burst": {"images": len(recorder.burst), "drain_s": recorder.burst_drain()},
+        "rss_mb": {
+            "start": recorder.rss[0] / 2 ** 20 if recorder.rss else None,
+            "peak": max(recorder.rss) / 2 ** 20 if recorder.rss else None,
+            "end": recorder.rss[-1] / 2 ** 20 if recorder.rss else None,
+        },
+        "cpu_percent": 100 * recorder.cpu_seconds / elapsed,
+        "api_calls": recorder.api_calls,
+        "ratelimits": recorder.ratelimits,
+        "stats_edits": recorder.stats_edits,
+    }
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.0f} ms"
+
+    print(f"\nDurée : {elapsed:.1f} s (production {produced_for:.1f} s)")
+    print(f"{'flux':<10}{'produits':>10}{'postés':>10}{'débit/s':>10}{'p50':>12}{'p95':>12}{'p99':>12}{'max':>12}")
+    for kind in ("sstv", "wspr", "ft8"):
+        lat = result["latency_s"][kind]
+        print(
+            f"{kind:<10}{result['produced'][kind]:>10}{result['delivered'][kind]:>10}"
+            f"{result['throughput_per_s'][kind]:>10.2f}{ms(lat['p50']):>12}{ms(lat['p95']):>12}{ms(lat['p99']):>12}{ms(lat['max']):>12}"
+        )
+    reactions = result["reaction_latency_s"]
+    lag = result["event_loop_lag_s"]
+    rss = result["rss_mb"]
+    print(f"Réactions traitées : {reactions['count']} (p50 {ms(reactions['p50'])}, p95 {ms(reactions['p95'])})")
+    if result["burst"]["images"]:
+        drain = result["burst"]["drain_s"]
+        print(f"Rafale de {result['burst']['images']} images : " + (f"vidée en {drain:.1f} s" if drain is not None else "non vidée"))
+    print(f"Retard de la boucle : p50 {ms(lag['p50'])}, p99 {ms(lag['p99'])}, max {ms(lag['max'])}")
+    if rss["peak"] is not None:
+        print(f"RSS : {rss['start']:.1f} Mo au départ, {rss['peak']:.1f} Mo au pic, {rss['end']:.1f} Mo à la fin")
+    print(f"CPU du processus principal : {recorder.cpu_seconds:.2f} s ({result['cpu_percent']:.1f} %)")
+    print(f"Appels API : {recorder.api_calls}, 429 : {recorder.ratelimits}, éditions du message de stats : {recorder.stats_edits}")
+    return result
+
+def compare_watch_modes(args):
+    # Un import de detect_sstv par processus : chaque mode tourne dans son propre sous-processus
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="sstv-bench-cmp-") as tmp:
+        for mode in ("poll", "auto"):
+            path = os.path.join(tmp, f"{mode}.json")
+            subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--watch-mode", mode, "--json", path], check=True)
+            with open(path) as f:
+                results[mode] = json.load(f)
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.0f} ms"
+
+    print(f"\nComparaison avec {args.prefill} fichiers déjà présents")
+    print(f"{'mode':<8}{'SSTV p50':>12}{'SSTV p95':>12}{'CPU':>10}{'lag p99':>12}{'lag max':>12}")
+    for mode, result in results.items():
+        lat, lag = result["latency_s"]["sstv"], result["event_loop_lag_s"]
+        print(f"{mode:<8}{ms(lat['p50']):>12}{ms(lat['p95']):>12}{result['cpu_percent']:>9.1f}%{ms(lag['p99']):>12}{ms(lag['max']):>12}")
+    if args.json:
+        with open(os.path.abspath(args.json), "w") as f:
+            json.dump(results, f, indent=2)
+
+def main():
+    args = parse_args()
+    if args.watch_mode == "both":
+        compare_watch_modes(args)
+        return
+    if args.json:
+        args.json = os.path.abspath(args.json)  # on change de dossier avant l'import du bot
+    rng = random.Random(args.seed)
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="sstv-bench-") as workdir:
+        env = {}
+        if args.receivers > 1:
+            entries = []
+            for i in range(args.receivers):
+                rx_dir = os.path.join(workdir, f"rx{i}")
+                os.makedirs(os.path.join(rx_dir, "watched"))
+                entries.append({
+                    "name": f"rx{i}",
+                    "watched_folder": os.path.join(rx_dir, "watched"),
+                    "sstv_channel_id": 2000 + 10 * i,
+                    "wspr_file": os.path.join(rx_dir, "ALL_WSPR.TXT"),
+                    "wspr_channel_id": 2001 + 10 * i,
+                    "decoded_file": os.path.join(rx_dir, "decoded.txt"),
+                    "decoded_channel_id": 2002 + 10 * i,
+                })
+                for name in ("ALL_WSPR.TXT", "decoded.txt"):
+                    open(os.path.join(rx_dir, name), "w").close()
+            with open(os.path.join(workdir, "receivers.json"), "w") as f:
+                json.dump(entries, f)
+            env["RECEIVERS_FILE"] = os.path.join(workdir, "receivers.json")
+        d = load_bot(workdir, **env)
+        if args.prefill:
+            prefill_folder(d, args.prefill)
+
+        recorder = Recorder()
+        try:
+            produced_for, elapsed = asyncio.run(run(args, d, recorder, rng))
+        finally:
+            if d.image_pool is not None:
+                d.image_pool.shutdown()
+            d.db.close()
+
+        result = report(args, recorder, produced_for, elapsed)
+        if args.metrics:
+            print()
+            print(d.render_metrics())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
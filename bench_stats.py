@@ -0,0 +1,91 @@
+# file: bench_stats.py
+# Mesure des statistiques SSTV sur une grosse base : construction d'un historique synthétique,
+# reconstruction des compteurs (backfill_daily_stats) puis lecture de l'instantané
+# (refresh_stats_snapshot) comparée aux six COUNT(*) d'origine.
+#
+#   python bench_stats.py --events 1000000 --repeat 20
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bench_common import load_bot, summarize, ms
+
+# Requêtes de update_stats_message avant les compteurs matérialisés
+OLD_QUERIES = (
+    ("SELECT COUNT(*) FROM sstv_events WHERE DATE(timestamp) = ?", True),
+    ("SELECT COUNT(*) FROM sstv_events WHERE DATE(timestamp) = ? AND validated = 1", True),
+    ("SELECT COUNT(*) FROM sstv_events WHERE DATE(timestamp) = ? AND validated = 0", True),
+    ("SELECT COUNT(*) FROM sstv_events WHERE validated = 1", False),
+    ("SELECT COUNT(*) FROM sstv_events WHERE validated = 0", False),
+    ("SELECT MAX(timestamp) FROM sstv_events", False),
+)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark des statistiques SSTV sur une grosse base")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=730, help="étalement de l'historique")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+def build_events(d, count, days, rng, batch=50_000):
+    now = datetime.now()
+    span = days * 86400
+    for start in range(0, count, batch):
+        rows = []
+        for i in range(start, min(count, start + batch)):
+            ts = now - timedelta(seconds=rng.randrange(span))
+            rows.append((f"SSTV-{i:07d}.png", ts.strftime("%Y-%m-%d %H:%M:%S"), rng.choice((0, 1, 1, None)), i))
+        d.db.call(lambda conn: conn.executemany(
+            "INSERT INTO sstv_events (filename, timestamp, validated, message_id) VALUES (?, ?, ?, ?)", rows
+        ))
+
+def old_snapshot(conn, day):
+    return [conn.execute(sql, (day,) if per_day else ()).fetchone()[0] for sql, per_day in OLD_QUERIES]
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="sstv-bench-stats-") as workdir:
+        d = load_bot(workdir)
+
+        start = time.perf_counter()
+        build_events(d, args.events, args.days, rng)
+        print(f"{args.events} événements insérés (triggers actifs) en {time.perf_counter() - start:.1f} s")
+
+        # Base « d'avant » : sans compteurs, backfill_daily_stats les reconstruit en un passage
+        d.db.call(lambda conn: conn.executescript("DELETE FROM sstv_totals; DELETE FROM sstv_daily_stats;"))
+        start = time.perf_counter()
+        d.db.call(d.backfill_daily_stats)
+        print(f"backfill_daily_stats : {time.perf_counter() - start:.2f} s")
+
+        day = datetime.now().date().isoformat()
+        loop = asyncio.new_event_loop()
+        new = timed(lambda: loop.run_until_complete(d.refresh_stats_snapshot()), args.repeat)
+        old = timed(lambda: d.db.call(lambda conn: old_snapshot(conn, day)), args.repeat)
+        loop.close()
+
+        expected = d.db.call(lambda conn: old_snapshot(conn, day))
+        s = d.sstv_stats
+        got = [s["total_today"], s["approved_today"], s["rejected_today"], s["total_approved"], s["total_rejected"], s["last_sstv"]]
+        print(f"Résultats identiques : {'oui' if got == expected else f'NON {got} != {expected}'}")
+
+        print(f"{'lecture':<24}{'p50':>12}{'p95':>12}{'max':>12}")
+        for name, stats in (("refresh_stats_snapshot", new), ("6 COUNT(*) d'origine", old)):
+            print(f"{name:<24}{ms(stats['p50']):>12}{ms(stats['p95']):>12}{ms(stats['max']):>12}")
+        d.db.close()
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,41 @@ import time
 import asyncio
 import discord
 import sqlite3
-import subprocess
 import logging
 import psutil
 import shutil
+import ctypes
+import ctypes.util
+import struct
+import threading
+import queue
+import atexit
+import concurrent.futures
+import tempfile
+import csv
+import zipfile
+import re
+import itertools
+import bisect
+import functools
+import aiohttp
+from aiohttp import web
 from discord.ext import tasks, commands
 from discord import app_commands, Status, Activity, ActivityType
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from dotenv import load_dotenv
-from collections import deque
+from collections import deque, OrderedDict
 from discord.ext.commands import Context
 import json
+import hashlib
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # Pillow absent : les images sont envoyées telles quelles
+try:
+    import numpy as np
+except ImportError:
+    np = None  # NumPy absent : pas de note de qualité
 load_dotenv()
 USER_DATA_DIR = "user_data"
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
@@ -23,11 +47,55 @@ WATCHED_FOLDER = os.getenv("WATCHED_FOLDER", "/tmp")
 SSTV_CHANNEL_ID = int(os.getenv("SSTV_CHANNEL_ID"))
 STATS_CHANNEL_ID = int(os.getenv("STATS_CHANNEL_ID"))
 SDR_PING_HOST = os.getenv("SDR_PING_HOST", "192.168.1.1")
-# Nom du fichier JSON où la date et l'heure sont stockées
-LAST_SENT_FILE = "last_sent.json"
-DECODED_FILE_PATH = "/tmp/decoded.txt"  # Le chemin vers le fichier contenant les messages FT8 décodés
+# Liste séparée par des virgules : "hôte" = ping ICMP, "hôte:port" = connexion TCP (ex. port OpenWebRX)
+SDR_PROBE_HOSTS = [h.strip() for h in os.getenv("SDR_PROBE_HOSTS", SDR_PING_HOST).split(",") if h.strip()]
+PROBE_TIMEOUT = 1.0
+PROBE_HISTORY = 120  # 1 h d'historique à raison d'une sonde toutes les 30 s
+SEEN_CACHE_SIZE = int(os.getenv("SEEN_CACHE_SIZE", "5000"))
+SEEN_WINDOW_DAYS = int(os.getenv("SEEN_WINDOW_DAYS", "7"))
+MESSAGE_CACHE_SIZE = 1000
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "3"))
+STABLE_CHECK_INTERVAL = 0.25
+STABLE_CHECK_TIMEOUT = 30
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(1024 * 1024)))
+PREVIEW_SIZE = 160
+# "thread" = répondre au post d'origine avec un aperçu, "suppress" = ne pas poster, "off" = pas de dédoublonnage
+DEDUP_MODE = os.getenv("DEDUP_MODE", "thread")
+DEDUP_DISTANCE = int(os.getenv("DEDUP_DISTANCE", "6"))
+DEDUP_WINDOW_HOURS = float(os.getenv("DEDUP_WINDOW_HOURS", "2"))
+# Résumés WSPR/FT8 : un embed par cycle au lieu d'un message par ligne (SPOT_DIGEST=0 pour l'ancien mode)
+SPOT_DIGEST = os.getenv("SPOT_DIGEST", "1") != "0"
+DIGEST_MAX_SPOTS = 30
+DIGEST_QUIET_SECONDS = 15
+DIGEST_MAX_AGE = 120
+DIGEST_DEDUP_MINUTES = int(os.getenv("DIGEST_DEDUP_MINUTES", "10"))
+# Sous QUALITY_THRESHOLD (note 0-100) : "hold" = envoi dans QUALITY_HOLD_CHANNEL_ID pour relecture
+# (ou post marqué dans le salon SSTV s'il n'est pas défini), "reject" = pas de post, "off" = note seulement
+QUALITY_THRESHOLD = float(os.getenv("QUALITY_THRESHOLD", "25"))
+QUALITY_ACTION = os.getenv("QUALITY_ACTION", "hold")
+QUALITY_HOLD_CHANNEL_ID = int(os.getenv("QUALITY_HOLD_CHANNEL_ID") or 0)
+# "auto" = inotify si disponible, sinon polling ; "poll" = toujours polling
+WATCH_MODE = os.getenv("WATCH_MODE", "auto")
+# Fichier JSON décrivant plusieurs récepteurs (voir README) ; sans lui, un seul récepteur
+# "default" est construit à partir de WATCHED_FOLDER, SSTV_CHANNEL_ID, SDR_PROBE_HOSTS, etc.
+RECEIVERS_FILE = os.getenv("RECEIVERS_FILE")
+DEFAULT_RECEIVER = "default"
+# Rétention, toutes les RETENTION_INTERVAL_HOURS. Sans ARCHIVE_DIR les images postées restent en place ;
+# ARCHIVE_FORMAT "png" = simple déplacement, "jpeg" ou "webp" = recompression (Pillow). 0 jour = jamais.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")
+ARCHIVE_AFTER_HOURS = float(os.getenv("ARCHIVE_AFTER_HOURS", "24"))
+ARCHIVE_FORMAT = os.getenv("ARCHIVE_FORMAT", "png")
+ARCHIVE_QUALITY = 85
+REJECTED_RETENTION_DAYS = float(os.getenv("REJECTED_RETENTION_DAYS", "7"))
+EVENT_RETENTION_DAYS = float(os.getenv("EVENT_RETENTION_DAYS", "365"))
+SPOT_RETENTION_DAYS = float(os.getenv("SPOT_RETENTION_DAYS", "90"))
+RETENTION_INTERVAL_HOURS = 6
+RETENTION_BATCH = 500
+# Métriques au format Prometheus sur http://METRICS_HOST:METRICS_PORT/metrics (0 = désactivé)
+METRICS_PORT = int(os.getenv("METRICS_PORT") or 0)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+DECODED_FILE_PATH = os.getenv("DECODED_FILE_PATH", "/tmp/decoded.txt")  # Le chemin vers le fichier contenant les messages FT8 décodés
 DECODED_CHANNEL_ID = 1360728278305996830  # ID du salon Discord pour l'envoi des messages FT8
-last_decoded_lines = []
 
 
 logging.basicConfig(level=logging.INFO)
@@ -38,28 +106,1105 @@ intents.message_content = True
 intents.reactions = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
-conn = sqlite3.connect("sstv_stats.db")
-c = conn.cursor()
-c.execute("""
+metrics_registry = []
+
+class Metric:
+    # Métrique exposée au format texte Prometheus ; étiquettes passées en arguments nommés.
+    # Verrouillée car mise à jour aussi depuis les threads SQLite.
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.values = {}
+        metrics_registry.append(self)
+
+    @staticmethod
+    def format_labels(labels):
+        if not labels:
+            return ""
+        pairs = ",".join(
+            '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels
+        )
+        return "{" + pairs + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = list(self.values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{self.format_labels(labels)} {value:g}")
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Un compteur par seau (non cumulé), puis la somme et le nombre d'observations
+                counts = self.values[key] = [0] * (len(self.buckets) + 3)
+            counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = [(labels, list(counts)) for labels, counts in self.values.items()]
+        for labels, counts in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{self.format_labels((*labels, ('le', le)))} {cumulative}")
+            lines.append(f"{self.name}_sum{self.format_labels(labels)} {counts[-2]:g}")
+            lines.append(f"{self.name}_count{self.format_labels(labels)} {counts[-1]}")
+        return lines
+
+def render_metrics():
+    return "\n".join(line for metric in metrics_registry for line in metric.render()) + "\n"
+
+TASK_DURATION = Histogram("sstv_task_duration_seconds", "Durée d'un tour de chaque boucle périodique")
+FOLDER_SCAN_SECONDS = Histogram("sstv_folder_scan_seconds", "Durée d'un scan du dossier surveillé")
+FILE_TO_POST_SECONDS = Histogram(
+    "sstv_file_to_post_seconds", "Délai entre l'écriture d'une image et son post Discord",
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+)
+DISCORD_REQUEST_SECONDS = Histogram("sstv_discord_request_seconds", "Durée des appels à l'API REST Discord")
+DISCORD_RATELIMITS = Counter("sstv_discord_ratelimits_total", "Réponses 429 reçues de Discord")
+DISCORD_RATELIMIT_WAIT = Histogram("sstv_discord_ratelimit_wait_seconds", "Attente imposée par les 429 de Discord")
+BUCKET_WAIT_SECONDS = Histogram("sstv_bucket_wait_seconds", "Attente dans les limiteurs locaux par salon")
+SQLITE_QUERY_SECONDS = Histogram(
+    "sstv_sqlite_query_seconds", "Durée des requêtes SQLite",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+TAIL_BACKLOG_BYTES = Gauge("sstv_tail_backlog_bytes", "Octets restant à lire dans les fichiers suivis au début d'un tour")
+EVENT_LOOP_LAG = Histogram(
+    "sstv_event_loop_lag_seconds", "Retard de la boucle asyncio",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+def timed_task(coro):
+    # À placer sous @tasks.loop : mesure chaque tour de la boucle
+    @functools.wraps(coro)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await coro(*args, **kwargs)
+        finally:
+            TASK_DURATION.observe(time.perf_counter() - start, task=coro.__name__)
+    return wrapper
+
+def instrument_discord_http(http):
+    # Toutes les requêtes REST passent par HTTPClient.request ; la route est un gabarit
+    # (/channels/{channel_id}/messages), ce qui limite le nombre de séries
+    request = http.request
+
+    async def timed_request(route, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await request(route, *args, **kwargs)
+        finally:
+            DISCORD_REQUEST_SECONDS.observe(time.perf_counter() - start, method=route.method, route=route.path)
+
+    http.request = timed_request
+
+class RateLimitLogHandler(logging.Handler):
+    # discord.py gère les 429 lui-même et ne les signale que dans ses logs. Un 429 global
+    # produit les deux messages, "route" puis "global", sans await entre eux : le 429 de route
+    # n'est compté qu'au tour de boucle suivant, si le message global n'est pas venu entre-temps
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.pending = None
+
+    def emit(self, record):
+        msg = record.msg if isinstance(record.msg, str) else ""
+        if msg.startswith("We are being rate limited") and "Retrying" in msg:
+            self.flush_route()
+            self.pending = record.args[-1]
+            try:
+                asyncio.get_running_loop().call_soon(self.flush_route)
+            except RuntimeError:
+                self.flush_route()
+        elif msg.startswith("Global rate limit"):
+            self.pending = None
+            DISCORD_RATELIMITS.inc(scope="global")
+            DISCORD_RATELIMIT_WAIT.observe(record.args[-1], scope="global")
+
+    def flush_route(self):
+        if self.pending is not None:
+            wait, self.pending = self.pending, None
+            DISCORD_RATELIMITS.inc(scope="route")
+            DISCORD_RATELIMIT_WAIT.observe(wait, scope="route")
+
+instrument_discord_http(bot.http)
+logging.getLogger("discord.http").addHandler(RateLimitLogHandler(logging.WARNING))
+metrics_runner = None
+
+async def monitor_loop_lag(interval=0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+async def metrics_handler(request):
+    return web.Response(
+        body=render_metrics().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+async def start_metrics_server():
+    global metrics_runner
+    if not METRICS_PORT or metrics_runner is not None:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        # Point de terminaison optionnel : un port déjà pris ne doit pas empêcher le reste de démarrer
+        logging.error(f"Serveur de métriques non démarré sur {METRICS_HOST}:{METRICS_PORT}: {e}")
+        await runner.cleanup()
+        return
+    metrics_runner = runner
+    asyncio.get_running_loop().create_task(monitor_loop_lag())
+    logging.info(f"Métriques disponibles sur http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+class DBWorker:
+    # Accès SQLite mono-écrivain : toutes les requêtes passent par un thread dédié,
+    # les écritures en attente sont regroupées dans un seul commit. Les résultats d'un lot
+    # destinés à une boucle asyncio lui sont remis en un seul réveil (call_soon_threadsafe).
+    BATCH_SIZE = 256
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="sstv-db", daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-8000")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(None)
+                    break
+                batch.append(item)
+
+            results = []
+            for fn, future in batch:
+                if isinstance(future, concurrent.futures.Future):
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                elif future.cancelled():
+                    continue
+                start = time.perf_counter()
+                try:
+                    results.append((future, fn(conn), None))
+                except Exception as e:
+                    results.append((future, None, e))
+                SQLITE_QUERY_SECONDS.observe(time.perf_counter() - start, db="stats", op="query")
+            try:
+                if conn.in_transaction:
+                    start = time.perf_counter()
+                    conn.commit()
+                    SQLITE_QUERY_SECONDS.observe(time.perf_counter() - start, db="stats", op="commit")
+            except Exception as e:
+                logging.error(f"Échec du commit SQLite: {e}")
+                conn.rollback()
+                results = [(future, None, e) for future, _, _ in results]
+            by_loop = {}
+            for item in results:
+                future = item[0]
+                if isinstance(future, concurrent.futures.Future):
+                    self._resolve((item,))
+                else:
+                    by_loop.setdefault(future.get_loop(), []).append(item)
+            for loop, items in by_loop.items():
+                try:
+                    loop.call_soon_threadsafe(self._resolve, items)
+                except RuntimeError:
+                    pass  # boucle fermée : plus personne n'attend ces résultats
+        conn.close()
+
+    @staticmethod
+    def _resolve(items):
+        for future, result, error in items:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def submit(self, fn):
+        future = concurrent.futures.Future()
+        self.queue.put((fn, future))
+        return future
+
+    def call(self, fn):
+        return self.submit(fn).result()
+
+    async def run(self, fn):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put((fn, future))
+        return await future
+
+    async def execute(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+db = DBWorker("sstv_stats.db")
+atexit.register(db.close)
+
+db.call(lambda conn: conn.execute("""
 CREATE TABLE IF NOT EXISTS sstv_events (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     filename TEXT,
     timestamp TEXT,
     validated INTEGER
 )
-""")
-conn.commit()
+"""))
+
+def add_column_if_missing(conn, table, column, definition):
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+db.call(lambda conn: add_column_if_missing(conn, "sstv_events", "message_id", "INTEGER"))
+db.call(lambda conn: add_column_if_missing(conn, "sstv_events", "quality", "REAL"))
+db.call(lambda conn: add_column_if_missing(conn, "sstv_events", "receiver", f"TEXT NOT NULL DEFAULT '{DEFAULT_RECEIVER}'"))
+db.call(lambda conn: conn.execute("CREATE INDEX IF NOT EXISTS idx_sstv_events_message_id ON sstv_events (message_id)"))
+db.call(lambda conn: conn.execute("CREATE INDEX IF NOT EXISTS idx_sstv_events_filename ON sstv_events (filename)"))
+# Emplacement de l'image après la rétention : NULL = toujours dans le dossier surveillé,
+# chemin = archivée, "" = supprimée (ou disparue avant d'être archivée)
+db.call(lambda conn: add_column_if_missing(conn, "sstv_events", "stored_path", "TEXT"))
+db.call(lambda conn: conn.execute("CREATE INDEX IF NOT EXISTS idx_sstv_events_timestamp ON sstv_events (timestamp)"))
+# Compteurs matérialisés, tenus à jour par des triggers sur sstv_events.
+# Il n'y a volontairement pas de trigger DELETE : les agrégats survivent à la purge des événements.
+db.call(lambda conn: conn.executescript("""
+CREATE TABLE IF NOT EXISTS sstv_daily_stats (
+    day TEXT PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0,
+    approved INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    last_timestamp TEXT
+);
+CREATE TABLE IF NOT EXISTS sstv_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total INTEGER NOT NULL DEFAULT 0,
+    approved INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    last_timestamp TEXT
+);
+CREATE TRIGGER IF NOT EXISTS trg_sstv_events_insert AFTER INSERT ON sstv_events BEGIN
+    INSERT INTO sstv_daily_stats (day, total, approved, rejected, last_timestamp)
+    VALUES (DATE(NEW.timestamp), 1, NEW.validated IS 1, NEW.validated IS 0, NEW.timestamp)
+    ON CONFLICT (day) DO UPDATE SET
+        total = total + 1,
+        approved = approved + excluded.approved,
+        rejected = rejected + excluded.rejected,
+        last_timestamp = MAX(COALESCE(last_timestamp, ''), excluded.last_timestamp);
+    UPDATE sstv_totals SET
+        total = total + 1,
+        approved = approved + (NEW.validated IS 1),
+        rejected = rejected + (NEW.validated IS 0),
+        last_timestamp = MAX(COALESCE(last_timestamp, ''), NEW.timestamp)
+    WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_sstv_events_validate AFTER UPDATE OF validated ON sstv_events
+WHEN NEW.validated IS NOT OLD.validated BEGIN
+    UPDATE sstv_daily_stats SET
+        approved = approved + (NEW.validated IS 1) - (OLD.validated IS 1),
+        rejected = rejected + (NEW.validated IS 0) - (OLD.validated IS 0)
+    WHERE day = DATE(NEW.timestamp);
+    UPDATE sstv_totals SET
+        approved = approved + (NEW.validated IS 1) - (OLD.validated IS 1),
+        rejected = rejected + (NEW.validated IS 0) - (OLD.validated IS 0)
+    WHERE id = 1;
+END;
+"""))
+
+def backfill_daily_stats(conn):
+    # Une seule fois, pour les bases créées avant les compteurs matérialisés
+    if conn.execute("SELECT 1 FROM sstv_totals WHERE id = 1").fetchone():
+        return
+    logging.info("Reconstruction des statistiques SSTV journalières")
+    conn.execute("DELETE FROM sstv_daily_stats")
+    conn.execute("""
+        INSERT INTO sstv_daily_stats (day, total, approved, rejected, last_timestamp)
+        SELECT DATE(timestamp), COUNT(*), SUM(validated IS 1), SUM(validated IS 0), MAX(timestamp)
+        FROM sstv_events WHERE DATE(timestamp) IS NOT NULL GROUP BY DATE(timestamp)
+    """)
+    conn.execute("""
+        INSERT INTO sstv_totals (id, total, approved, rejected, last_timestamp)
+        SELECT 1, COUNT(*), COALESCE(SUM(validated IS 1), 0), COALESCE(SUM(validated IS 0), 0), MAX(timestamp)
+        FROM sstv_events
+    """)
+
+db.call(backfill_daily_stats)
+
+# Mêmes compteurs, ventilés par récepteur ; les totaux par récepteur sont la somme des jours
+db.call(lambda conn: conn.executescript("""
+CREATE TABLE IF NOT EXISTS sstv_receiver_stats (
+    receiver TEXT NOT NULL,
+    day TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    approved INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (receiver, day)
+);
+CREATE TRIGGER IF NOT EXISTS trg_sstv_events_receiver_insert AFTER INSERT ON sstv_events BEGIN
+    INSERT INTO sstv_receiver_stats (receiver, day, total, approved, rejected)
+    VALUES (NEW.receiver, DATE(NEW.timestamp), 1, NEW.validated IS 1, NEW.validated IS 0)
+    ON CONFLICT (receiver, day) DO UPDATE SET
+        total = total + 1,
+        approved = approved + excluded.approved,
+        rejected = rejected + excluded.rejected;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_sstv_events_receiver_validate AFTER UPDATE OF validated ON sstv_events
+WHEN NEW.validated IS NOT OLD.validated BEGIN
+    UPDATE sstv_receiver_stats SET
+        approved = approved + (NEW.validated IS 1) - (OLD.validated IS 1),
+        rejected = rejected + (NEW.validated IS 0) - (OLD.validated IS 0)
+    WHERE receiver = NEW.receiver AND day = DATE(NEW.timestamp);
+END;
+"""))
+
+def backfill_receiver_stats(conn):
+    if conn.execute("SELECT 1 FROM sstv_receiver_stats LIMIT 1").fetchone():
+        return
+    conn.execute("""
+        INSERT INTO sstv_receiver_stats (receiver, day, total, approved, rejected)
+        SELECT receiver, DATE(timestamp), COUNT(*), SUM(validated IS 1), SUM(validated IS 0)
+        FROM sstv_events WHERE DATE(timestamp) IS NOT NULL GROUP BY receiver, DATE(timestamp)
+    """)
+
+db.call(backfill_receiver_stats)
+
+# Instantané en mémoire lu par update_stats_message, rafraîchi par les chemins d'écriture
+sstv_stats = {
+    "day": None,
+    "total_today": 0,
+    "approved_today": 0,
+    "rejected_today": 0,
+    "total_approved": 0,
+    "total_rejected": 0,
+    "last_sstv": None,
+    "receivers": {},  # récepteur -> (total, approuvées, rejetées aujourd'hui, approuvées, rejetées au total)
+}
+
+def read_stats_snapshot(conn, day):
+    today = conn.execute(
+        "SELECT total, approved, rejected FROM sstv_daily_stats WHERE day = ?", (day,)
+    ).fetchone() or (0, 0, 0)
+    totals = conn.execute(
+        "SELECT approved, rejected, last_timestamp FROM sstv_totals WHERE id = 1"
+    ).fetchone() or (0, 0, None)
+    per_receiver = conn.execute("""
+        SELECT receiver,
+               SUM(CASE WHEN day = ?1 THEN total ELSE 0 END),
+               SUM(CASE WHEN day = ?1 THEN approved ELSE 0 END),
+               SUM(CASE WHEN day = ?1 THEN rejected ELSE 0 END),
+               SUM(approved), SUM(rejected)
+        FROM sstv_receiver_stats GROUP BY receiver
+    """, (day,)).fetchall()
+    return today, totals, per_receiver
+
+async def refresh_stats_snapshot():
+    day = date.today().isoformat()
+    today, totals, per_receiver = await db.run(lambda conn: read_stats_snapshot(conn, day))
+    sstv_stats.update(
+        day=day,
+        total_today=today[0],
+        approved_today=today[1],
+        rejected_today=today[2],
+        total_approved=totals[0],
+        total_rejected=totals[1],
+        last_sstv=totals[2],
+        receivers={row[0]: row[1:] for row in per_receiver},
+    )
+
+db.call(lambda conn: conn.execute("""
+CREATE TABLE IF NOT EXISTS seen_files (
+    filename TEXT,
+    inode INTEGER,
+    mtime INTEGER,
+    seen_at REAL,
+    PRIMARY KEY (filename, inode, mtime)
+)
+"""))
+db.call(lambda conn: conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_files_seen_at ON seen_files (seen_at)"))
+
+class SeenFileIndex:
+    # Index des fichiers déjà traités : LRU bornée en mémoire devant la table seen_files,
+    # pour ne rien reposter après un redémarrage sans garder tout l'historique en RAM
+    def __init__(self, db, capacity=SEEN_CACHE_SIZE):
+        self.db = db
+        self.capacity = capacity
+        self.cache = OrderedDict()
+        # Dossier -> noms déjà confirmés vus au dernier listage : reconstruit à chaque scan,
+        # donc borné par le contenu du dossier, sans stat ni requête pour ces noms
+        self.confirmed = {}
+
+    def load_recent(self, days=SEEN_WINDOW_DAYS):
+        since = time.time() - days * 86400
+        rows = self.db.call(lambda conn: conn.execute(
+            "SELECT filename, inode, mtime FROM seen_files WHERE seen_at >= ? ORDER BY seen_at DESC LIMIT ?",
+            (since, self.capacity)
+        ).fetchall())
+        for filename, inode, mtime in reversed(rows):
+            self._remember((filename, inode, mtime))
+
+    @staticmethod
+    def file_key(folder, filename):
+        # Le nom seul est stocké : l'inode distingue les fichiers homonymes de deux récepteurs
+        try:
+            st = os.stat(os.path.join(folder, filename))
+        except FileNotFoundError:
+            return None
+        return (filename, st.st_ino, int(st.st_mtime))
+
+    def _remember(self, key):
+        self.cache[key] = None
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.capacity:
+            self.cache.popitem(last=False)
+
+    async def contains(self, folder, filename):
+        key = self.file_key(folder, filename)
+        if key is None:
+            return True
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return True
+        row = await self.db.fetchone(
+            "SELECT 1 FROM seen_files WHERE filename = ? AND inode = ? AND mtime = ?", key
+        )
+        if row:
+            self._remember(key)
+            return True
+        return False
+
+    async def unseen(self, folder, names):
+        # Scan d'un dossier : seuls les noms absents du listage précédent sont stat()és,
+        # et ceux qui ne sont pas dans la LRU sont vérifiés en une seule requête
+        listed = set(names)
+        confirmed = self.confirmed.get(folder, set()) & listed
+        new = listed - confirmed
+        # Les stat() d'un premier scan (dossier entier) se font hors de la boucle
+        stat = lambda: [key for key in (self.file_key(folder, name) for name in new) if key is not None]
+        found_keys = await asyncio.get_running_loop().run_in_executor(None, stat) if len(new) > 100 else stat()
+        keys = []
+        for key in found_keys:
+            if key in self.cache:
+                confirmed.add(key[0])
+            else:
+                keys.append(key)
+        if keys:
+            def lookup(conn, chunk=300):
+                found = set()
+                for i in range(0, len(keys), chunk):
+                    part = keys[i:i + chunk]
+                    values = ", ".join("(?, ?, ?)" for _ in part)
+                    found.update(conn.execute(
+                        f"SELECT filename, inode, mtime FROM seen_files WHERE (filename, inode, mtime) IN (VALUES {values})",
+                        [v for key in part for v in key]
+                    ).fetchall())
+                return found
+            found = await self.db.run(lookup)
+            confirmed.update(key[0] for key in found)
+            keys = [key for key in keys if key not in found]
+        self.confirmed[folder] = confirmed
+        return [key[0] for key in keys]
+
+    async def add(self, folder, filename):
+        key = self.file_key(folder, filename)
+        if key is None:
+            return
+        self._remember(key)
+        if folder in self.confirmed:
+            self.confirmed[folder].add(filename)
+        await self.db.execute(
+            "INSERT OR REPLACE INTO seen_files (filename, inode, mtime, seen_at) VALUES (?, ?, ?, ?)",
+            key + (time.time(),)
+        )
+
+seen_index = SeenFileIndex(db)
+seen_index.load_recent()
+in_flight_files = set()  # chemins complets en cours de traitement
+
+db.call(lambda conn: conn.execute("""
+CREATE TABLE IF NOT EXISTS image_hashes (
+    event_id INTEGER PRIMARY KEY,
+    phash INTEGER,
+    message_id INTEGER,
+    created REAL
+)
+"""))
+db.call(lambda conn: conn.execute("CREATE INDEX IF NOT EXISTS idx_image_hashes_created ON image_hashes (created)"))
+
+def dhash(img, size=8):
+    # Hash perceptuel par différence (64 bits), stocké signé pour tenir dans un INTEGER SQLite
+    gray = img.convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits - (1 << 64) if bits >= 1 << 63 else bits
+
+def hamming(a, b):
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+def quality_score(img):
+    # Note 0-100 d'une image SSTV : une vraie image a des lignes successives corrélées et
+    # peu de bruit d'un pixel à l'autre ; le bruit et les lignes vides/brouillées font chuter la note
+    a = np.asarray(img.convert("L"), dtype=np.float32)
+    if a.shape[0] < 2 or a.shape[1] < 2:
+        return 0.0
+    centered = a - a.mean(axis=1, keepdims=True)
+    norms = np.sqrt((centered * centered).sum(axis=1))
+    dots = (centered[1:] * centered[:-1]).sum(axis=1)
+    denom = norms[1:] * norms[:-1]
+    row_corr = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+    blank = a.std(axis=1)[1:] < 2.0
+    garbage = ~blank & (row_corr < 0.2)
+    bad_lines = float(np.mean(blank | garbage))
+    correlation = float(np.median(np.clip(row_corr, 0, 1)))
+    # Variance des différences horizontales : ~0.17 (normalisée) pour du bruit blanc uniforme ;
+    # une image vide est "lisse" mais ne doit pas être récompensée pour autant
+    noise = float(np.var(np.diff(a, axis=1))) / (255.0 * 255.0)
+    smoothness = (1.0 - min(1.0, noise / 0.1)) * (1.0 - float(np.mean(blank)))
+    return round(100 * (0.4 * correlation + 0.3 * smoothness + 0.3 * (1 - bad_lines)), 1)
+
+def preprocess_image(filepath, out_dir):
+    # Exécuté dans un processus séparé : ré-encodage plafonné, aperçu, hash perceptuel et note de qualité
+    with Image.open(filepath) as img:
+        rgb = img.convert("RGB")
+    phash = dhash(rgb)
+    score = quality_score(rgb) if np is not None else None
+    base = os.path.splitext(os.path.basename(filepath))[0]
+
+    jpeg_path = os.path.join(out_dir, base + ".jpg")
+    quality = 90
+    while True:
+        rgb.save(jpeg_path, "JPEG", quality=quality, optimize=True)
+        if os.path.getsize(jpeg_path) <= IMAGE_MAX_BYTES or quality <= 50:
+            break
+        quality -= 10
+    upload_path = jpeg_path if os.path.getsize(jpeg_path) < os.path.getsize(filepath) else filepath
+
+    preview = rgb.copy()
+    preview.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE))
+    preview_path = os.path.join(out_dir, base + "-preview.jpg")
+    preview.save(preview_path, "JPEG", quality=80)
+    return upload_path, preview_path, phash, score
+
+image_pool = None
+
+def get_image_pool():
+    global image_pool
+    if image_pool is None:
+        image_pool = concurrent.futures.ProcessPoolExecutor(max_workers=2)
+    return image_pool
+
+async def prepare_image(filepath, out_dir):
+    if Image is None:
+        return filepath, None, None, None
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_image_pool(), preprocess_image, filepath, out_dir)
+    except Exception as e:
+        logging.error(f"Prétraitement impossible pour {filepath}, envoi brut: {e}")
+        return filepath, None, None, None
+
+class ImageHashIndex:
+    # Hashs des images récentes en mémoire (fenêtre DEDUP_WINDOW_HOURS), persistés dans image_hashes
+    def __init__(self, db, capacity=500):
+        self.db = db
+        self.recent = deque(maxlen=capacity)
+
+    def load_recent(self):
+        since = time.time() - DEDUP_WINDOW_HOURS * 3600
+        rows = self.db.call(lambda conn: conn.execute("""
+            SELECT h.created, h.phash, h.message_id, COALESCE(e.receiver, ?), h.event_id
+            FROM image_hashes h LEFT JOIN sstv_events e ON e.id = h.event_id
+            WHERE h.created >= ? ORDER BY h.created
+        """, (DEFAULT_RECEIVER, since)).fetchall())
+        self.recent.extend(rows)
+
+    def find_duplicate(self, phash, receiver):
+        # Seulement parmi les images du même récepteur : la réponse doit viser son salon
+        since = time.time() - DEDUP_WINDOW_HOURS * 3600
+        for created, other, message_id, other_receiver, _ in reversed(self.recent):
+            if created < since:
+                break
+            if other_receiver == receiver and hamming(phash, other) <= DEDUP_DISTANCE:
+                return message_id
+        return None
+
+    async def add(self, event_id, phash, message_id, receiver):
+        created = time.time()
+        self.recent.append((created, phash, message_id, receiver, event_id))
+        await self.db.execute(
+            "INSERT OR REPLACE INTO image_hashes (event_id, phash, message_id, created) VALUES (?, ?, ?, ?)",
+            (event_id, phash, message_id, created)
+        )
+
+    async def remove(self, event_id, message_id):
+        # Post rejeté (donc supprimé) : son hash, et ceux qui le désignent comme original,
+        # ne doivent plus servir de référence aux quasi-doublons
+        self.recent = deque(
+            (entry for entry in self.recent if entry[4] != event_id and entry[2] != message_id),
+            maxlen=self.recent.maxlen
+        )
+        await self.db.execute("DELETE FROM image_hashes WHERE event_id = ? OR message_id = ?", (event_id, message_id))
 
-seen_files = set()
+image_index = ImageHashIndex(db)
+image_index.load_recent()
+sstv_queue = asyncio.Queue()  # (récepteur, nom de fichier)
+sstv_consumer_tasks = []
 stats_message = None
+stats_content = None  # dernier contenu envoyé, pour ne pas rééditer à l'identique
 MENTION_USER_ID = 552917118186684436
 
-ping_cache = deque(maxlen=1)
 ping_last_time = 0
 
 WSPR_CHANNEL_ID = 1360722712292757736
-WSPR_FILE_PATH = "/tmp/ALL_WSPR.TXT"
-last_wspl_lines = []
+WSPR_FILE_PATH = os.getenv("WSPR_FILE_PATH", "/tmp/ALL_WSPR.TXT")
+
+db.call(lambda conn: conn.execute("""
+CREATE TABLE IF NOT EXISTS runtime_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+)
+"""))
+
+def migrate_runtime_state(conn):
+    # Anciennes tables de curseurs (tail_offsets, feed_state) regroupées dans runtime_state
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "tail_offsets" in tables:
+        conn.executemany(
+            "INSERT OR IGNORE INTO runtime_state (key, value) VALUES (?, ?)",
+            [(f"tail:{path}", json.dumps([inode, offset]))
+             for path, inode, offset in conn.execute("SELECT path, inode, offset FROM tail_offsets").fetchall()]
+        )
+        conn.execute("DROP TABLE tail_offsets")
+    if "feed_state" in tables:
+        conn.executemany(
+            "INSERT OR IGNORE INTO runtime_state (key, value) VALUES (?, ?)",
+            [(f"feed:{feed}", json.dumps(high_water))
+             for feed, high_water in conn.execute("SELECT feed, high_water FROM feed_state").fetchall()]
+        )
+        conn.execute("DROP TABLE feed_state")
+
+db.call(migrate_runtime_state)
+
+class RuntimeState:
+    # État d'exécution persisté (valeurs JSON) : message de stats, empreinte de l'arbre
+    # de commandes, curseurs des fichiers suivis et des flux. Chargé une fois au démarrage.
+    def __init__(self, db):
+        self.db = db
+        rows = db.call(lambda conn: conn.execute("SELECT key, value FROM runtime_state").fetchall())
+        self.values = {key: json.loads(value) for key, value in rows}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    @staticmethod
+    def store(conn, key, value):
+        # Depuis le thread SQLite, pour écrire dans la même transaction que d'autres données
+        conn.execute("INSERT OR REPLACE INTO runtime_state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def set(self, key, value):
+        # Pas d'attente : le thread SQLite applique les écritures dans l'ordre
+        self.values[key] = value
+        self.db.submit(lambda conn: self.store(conn, key, value))
+
+runtime_state = RuntimeState(db)
+
+class TailReader:
+    # Lecture incrémentale d'un fichier journal : on garde (inode, offset) et on ne lit
+    # que les octets ajoutés depuis le dernier passage. Gère la troncature et la rotation.
+    # Un passage ne déplace pas le curseur : il laisse la nouvelle position dans next_cursor,
+    # que l'appelant enregistre avec ses données puis applique par advance().
+    CHUNK_SIZE = 64 * 1024
+    # Au plus MAX_READ_BYTES par passage : un gros arriéré (redémarrage, rattrapage) est lu
+    # sur plusieurs tours au lieu d'être chargé et analysé d'un bloc
+    MAX_READ_BYTES = 2 * 1024 * 1024
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self.key = f"tail:{path}"
+        cursor = state.get(self.key)
+        if cursor:
+            self.inode, self.offset = cursor
+        else:
+            # Premier démarrage : on ne renvoie pas tout l'historique du fichier
+            try:
+                st = os.stat(path)
+                self.inode, self.offset = st.st_ino, st.st_size
+            except FileNotFoundError:
+                self.inode, self.offset = None, 0
+            self.state.set(self.key, [self.inode, self.offset])
+        self.next_cursor = [self.inode, self.offset]
+
+    def advance(self, cursor):
+        self.inode, self.offset = cursor
+
+    def read_new_lines(self):
+        self.next_cursor = [self.inode, self.offset]
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        inode, offset = self.inode, self.offset
+        try:
+            st = os.fstat(f.fileno())
+            if st.st_ino != inode or st.st_size < offset:
+                # Fichier remplacé (rotation) ou tronqué : on repart du début
+                inode, offset = st.st_ino, 0
+            start_offset = offset
+            TAIL_BACKLOG_BYTES.set(st.st_size - offset, path=self.path)
+            end = min(st.st_size, offset + self.MAX_READ_BYTES)
+            f.seek(offset)
+            pending = b""
+            while offset + len(pending) < end:
+                chunk = f.read(min(self.CHUNK_SIZE, end - offset - len(pending)))
+                if not chunk:
+                    break
+                *lines, pending = (pending + chunk).split(b"\n")
+                for raw in lines:
+                    line = raw.decode("utf-8", errors="replace").strip()
+                    if line:
+                        yield line
+                    offset += len(raw) + 1
+            # Une ligne sans retour à la ligne final est en cours d'écriture : relue au prochain tour
+            if end < st.st_size and offset == start_offset:
+                # Sauf si elle dépasse à elle seule MAX_READ_BYTES : ce n'est pas une ligne de décodage
+                logging.warning(f"{self.path}: ligne de plus de {self.MAX_READ_BYTES} octets ignorée")
+                offset += len(pending)
+        finally:
+            f.close()
+            self.next_cursor = [inode, offset]
+
+db.call(lambda conn: conn.executescript("""
+CREATE TABLE IF NOT EXISTS decoded_spots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    feed TEXT,
+    stamp INTEGER,
+    call TEXT,
+    to_call TEXT,
+    mode TEXT,
+    snr INTEGER,
+    freq REAL,
+    line TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_decoded_spots_feed_stamp ON decoded_spots (feed, stamp);
+CREATE INDEX IF NOT EXISTS idx_decoded_spots_call ON decoded_spots (call);
+"""))
+db.call(lambda conn: add_column_if_missing(conn, "decoded_spots", "receiver", f"TEXT NOT NULL DEFAULT '{DEFAULT_RECEIVER}'"))
+
+class Spot:
+    # stamp = AAMMJJHHMMSS en entier : comparable directement, sans objet datetime ;
+    # id = ligne dans decoded_spots, connu une fois le lot enregistré
+    __slots__ = ("feed", "stamp", "call", "to_call", "mode", "snr", "freq", "line", "id")
+
+    def __init__(self, feed, stamp, call, to_call, mode, snr, freq, line, id=None):
+        self.feed = feed
+        self.stamp = stamp
+        self.call = call
+        self.to_call = to_call
+        self.mode = mode
+        self.snr = snr
+        self.freq = freq
+        self.line = line
+        self.id = id
+
+# Les deux fichiers datent leurs lignes en AAMMJJ (convention WSJT-X), ex. "250411 1750"
+WSPR_LINE = re.compile(r"(\d{6})\s+(\d{4})\s+(-?\d+)\s+-?[\d.]+\s+([\d.]+)\s+(\S+)")
+DECODED_LINE = re.compile(r"(\d{6})(?:[ _](\d{6}|\d{4}))?\s")
+
+def parse_wspr_line(line):
+    m = WSPR_LINE.match(line)
+    if m is None:
+        return None
+    day, hhmm, snr, freq, call = m.groups()
+    return Spot("wspr", int(day + hhmm + "00"), call, None, "WSPR", int(snr), float(freq), line)
+
+def parse_decoded_line(line):
+    m = DECODED_LINE.match(line)
+    parts = line.split()
+    if m is None or len(parts) < 7:
+        return None
+    # L'heure est prise en compte : auparavant seule la date l'était et tout message
+    # après le premier de la journée était ignoré
+    hms = (m.group(2) or "000000").ljust(6, "0")
+    return Spot("ft8", int(m.group(1) + hms), parts[-3], parts[-2], parts[-1], None, None, line)
+
+def format_wspr_spot(spot):
+    return (
+        f"📡 Nouveau message WSPR reçu :\n"
+        f"```{spot.line}```\n"
+        f"🔗 QRZ : [**{spot.call}**](https://www.qrz.com/db/{spot.call})"  # Call sign cliquable
+    )
+
+def format_ft8_spot(spot):
+    return (
+        f"📡 Nouveau message FT8 reçu :\n"
+        f"```{spot.line}```\n"
+        f"🔗 QRZ (Emetteur) : [**{spot.call}**](https://www.qrz.com/db/{spot.call})\n"
+        f"🔗 QRZ (Récepteur) : [**{spot.to_call}**](https://www.qrz.com/db/{spot.to_call})"
+    )
+
+def format_wspr_digest_line(spot):
+    return f"`{str(spot.stamp)[6:10]}` [**{spot.call}**](https://www.qrz.com/db/{spot.call}) `{spot.snr} dB` `{spot.freq} MHz`"
+
+def format_ft8_digest_line(spot):
+    return (
+        f"`{str(spot.stamp)[6:12]}` [**{spot.call}**](https://www.qrz.com/db/{spot.call}) → "
+        f"[**{spot.to_call}**](https://www.qrz.com/db/{spot.to_call}) `{spot.mode}`"
+    )
+
+class SpotDigest:
+    # Regroupe les spots d'un cycle de décodage en un seul embed. Un indicatif déjà publié
+    # dans les DIGEST_DEDUP_MINUTES précédentes n'a pas de nouvelle ligne : il est compté
+    # dans le pied de l'embed suivant, et tous les spots restent dans decoded_spots.
+    def __init__(self, title, line_formatter):
+        self.title = title
+        self.line_formatter = line_formatter
+        self.spots = []
+        self.first_added = 0
+        self.last_added = 0
+        self.posted_calls = {}  # indicatif -> dernier affichage (time.monotonic)
+        self.repeats = {}  # indicatif -> nombre de spots non affichés depuis le dernier embed
+
+    def add(self, spots):
+        now = time.monotonic()
+        if not self.spots:
+            self.first_added = now
+        self.spots.extend(spots)
+        self.last_added = now
+
+    def due(self):
+        if not self.spots:
+            return False
+        now = time.monotonic()
+        return (
+            len(self.spots) >= DIGEST_MAX_SPOTS
+            or now - self.last_added >= DIGEST_QUIET_SECONDS
+            or now - self.first_added >= DIGEST_MAX_AGE
+        )
+
+    def flush(self):
+        # Renvoie (embed ou None, id decoded_spots du dernier spot traité par ce lot)
+        batch, self.spots = self.spots[:DIGEST_MAX_SPOTS], self.spots[DIGEST_MAX_SPOTS:]
+        posted_id = batch[-1].id
+        if self.spots:
+            self.first_added = time.monotonic()
+        now = time.monotonic()
+        window = DIGEST_DEDUP_MINUTES * 60
+        self.posted_calls = {call: seen for call, seen in self.posted_calls.items() if now - seen < window}
+
+        lines = []
+        shown = {}
+        for spot in batch:
+            if spot.call in shown or spot.call in self.posted_calls:
+                self.repeats[spot.call] = self.repeats.get(spot.call, 0) + 1
+                continue
+            shown[spot.call] = now
+            lines.append(self.line_formatter(spot))
+        self.posted_calls.update(shown)
+        if not lines:
+            return None, posted_id
+
+        embed = discord.Embed(
+            title=f"📡 {self.title} — {len(batch)} spot(s), cycle {str(batch[0].stamp)[6:8]}:{str(batch[0].stamp)[8:10]}",
+            description="\n".join(lines)[:4096],
+            colour=discord.Colour.purple()
+        )
+        if self.repeats:
+            repeated = ", ".join(f"{call} ×{count}" for call, count in sorted(self.repeats.items(), key=lambda kv: -kv[1]))
+            embed.set_footer(text=f"🔁 Déjà vus récemment : {repeated}"[:2048])
+            self.repeats = {}
+        return embed, posted_id
+
+class DecoderFeed:
+    # Un fichier de décodage suivi en continu : lecture incrémentale, analyse, filtre sur
+    # le dernier horodatage traité (propre à chaque flux) et stockage des spots par lot
+    def __init__(self, name, path, parser, channel_id, formatter, digest, receiver=DEFAULT_RECEIVER):
+        self.name = name
+        self.receiver = receiver
+        self.parser = parser
+        self.channel_id = channel_id
+        self.formatter = formatter
+        self.digest = digest
+        self.reader = TailReader(path, runtime_state)
+        self.state_key = f"feed:{name}"
+        self.high_water = runtime_state.get(self.state_key, 0)
+        # Dernier spot publié sur Discord (id decoded_spots) : les spots enregistrés mais encore
+        # en attente dans le résumé au moment d'un arrêt sont republiés au démarrage
+        self.posted_key = f"posted:{name}"
+        self.spot_kind = name.rpartition(":")[2]
+        if digest is not None:
+            self.restore_pending()
+
+    def restore_pending(self):
+        posted = runtime_state.get(self.posted_key)
+        if posted is None:
+            # Premier démarrage avec ce suivi : rien de l'historique n'est republié
+            posted = db.call(lambda conn: conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM decoded_spots WHERE feed = ? AND receiver = ?",
+                (self.spot_kind, self.receiver)
+            ).fetchone()[0])
+            runtime_state.set(self.posted_key, posted)
+            return
+        rows = db.call(lambda conn: conn.execute(
+            "SELECT feed, stamp, call, to_call, mode, snr, freq, line, id FROM decoded_spots "
+            "WHERE feed = ? AND receiver = ? AND id > ? ORDER BY id",
+            (self.spot_kind, self.receiver, posted)
+        ).fetchall())
+        if rows:
+            logging.info(f"{self.name}: {len(rows)} spot(s) non publiés avant l'arrêt remis dans le résumé")
+            self.digest.add([Spot(*row) for row in rows])
+
+    def mark_posted(self, spot_id):
+        if spot_id is not None and spot_id > runtime_state.get(self.posted_key, 0):
+            runtime_state.set(self.posted_key, spot_id)
+
+    def read_batch(self):
+        # Renvoie (spots, nouveau curseur du fichier) ; rien n'est enregistré ici
+        spots = []
+        parser, high_water = self.parser, self.high_water
+        for line in self.reader.read_new_lines():
+            spot = parser(line)
+            if spot is None:
+                continue
+            if spot.stamp < high_water:
+                continue
+            spots.append(spot)
+        return spots, self.reader.next_cursor
+
+    async def commit_batch(self, spots, cursor):
+        # Spots, curseur du fichier et high-water mark dans une seule transaction ; l'état en
+        # mémoire n'avance qu'une fois le commit fait, sinon le même passage sera relu
+        receiver = self.receiver
+        rows = [(s.feed, s.stamp, s.call, s.to_call, s.mode, s.snr, s.freq, s.line, receiver) for s in spots]
+        key, high_water = self.state_key, max([self.high_water] + [spot.stamp for spot in spots])
+        tail_key = self.reader.key
+
+        def store(conn):
+            last_id = None
+            if rows:
+                conn.executemany(
+                    "INSERT INTO decoded_spots (feed, stamp, call, to_call, mode, snr, freq, line, receiver) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                # Un seul écrivain et AUTOINCREMENT : les ids du lot se suivent jusqu'au dernier
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                runtime_state.store(conn, key, high_water)
+            runtime_state.store(conn, tail_key, cursor)
+            return last_id
+
+        last_id = await db.run(store)
+        for offset, spot in enumerate(reversed(spots)):
+            spot.id = last_id - offset
+        runtime_state.values[tail_key] = cursor
+        self.reader.advance(cursor)
+        if rows:
+            runtime_state.values[key] = self.high_water = high_water
+
+async def process_feed(feed):
+    channel = bot.get_channel(feed.channel_id)
+    if not channel:
+        return
+
+    # Lecture et analyse hors de la boucle asyncio : un arriéré de plusieurs Mo ne la bloque pas
+    spots, cursor = await asyncio.get_running_loop().run_in_executor(None, feed.read_batch)
+    if cursor != [feed.reader.inode, feed.reader.offset]:
+        # Un seul point de reprise (curseur, high-water mark et spots) par lot
+        await feed.commit_batch(spots, cursor)
+    if spots:
+        if not SPOT_DIGEST:
+            for spot in spots:
+                await channel_bucket(channel.id, "send").acquire()
+                await channel.send(feed.formatter(spot))
+                feed.mark_posted(spot.id)
+            return
+        feed.digest.add(spots)
+
+    while feed.digest.due():
+        embed, posted_id = feed.digest.flush()
+        if embed is not None:
+            await channel_bucket(channel.id, "send").acquire()
+            await channel.send(embed=embed)
+        feed.mark_posted(posted_id)
+
+async def process_feeds(feeds, loop_name):
+    # Les flux de tous les récepteurs en parallèle ; une erreur sur l'un ne bloque pas les autres
+    results = await asyncio.gather(*(process_feed(feed) for feed in feeds), return_exceptions=True)
+    for feed, result in zip(feeds, results):
+        if isinstance(result, Exception):
+            logging.error(f"Erreur dans {loop_name} ({feed.name}): {result}")
 
 def format_uptime(seconds):
     hours = int(seconds // 3600)
@@ -71,60 +1216,449 @@ def extract_filename(message):
         return attachment.filename
     return ""
 
-def ping(host):
-    try:
-        result = subprocess.run(
-            ["ping", "-c", "1", "-W", "1", host],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True
+def is_sstv_file(filename):
+    return filename.startswith("SSTV-") and filename.lower().endswith(".png")
+
+def scan_sstv_folder(folder):
+    with os.scandir(folder) as it:
+        return [entry.name for entry in it if is_sstv_file(entry.name)]
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+class InotifyWatcher:
+    # Surveillance du dossier d'un récepteur via inotify (Linux) : seuls les fichiers fermés
+    # en écriture ou déplacés dans le dossier et correspondant à SSTV-*.png sont mis dans la file
+    def __init__(self, receiver, queue):
+        self.receiver = receiver
+        self.folder = receiver.watched_folder
+        self.queue = queue
+        self.fd = None
+        self.loop = None
+
+    def start(self, loop):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        if libc.inotify_add_watch(fd, os.fsencode(self.folder), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, os.strerror(errno), self.folder)
+        try:
+            loop.add_reader(fd, self._on_readable)
+        except NotImplementedError:
+            os.close(fd)
+            raise
+        self.fd = fd
+        self.loop = loop
+
+    def stop(self):
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Des événements ont été perdus : on rescanne le dossier une fois
+                logging.warning(f"File inotify saturée, rescan de {self.folder}")
+                self.loop.create_task(enqueue_existing_files(self.receiver))
+            elif is_sstv_file(name):
+                self.queue.put_nowait((self.receiver, name))
+
+async def enqueue_existing_files(receiver):
+    folder = receiver.watched_folder
+    start = time.perf_counter()
+    # Listage hors de la boucle : plusieurs dizaines de ms sur un dossier de 50k images
+    files = await asyncio.get_running_loop().run_in_executor(None, scan_sstv_folder, folder)
+    FOLDER_SCAN_SECONDS.observe(time.perf_counter() - start)
+    for f in sorted(await seen_index.unseen(folder, files)):
+        if os.path.join(folder, f) not in in_flight_files:
+            sstv_queue.put_nowait((receiver, f))
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class HostProber:
+    # Sonde asynchrone d'un hôte SDR, avec historique circulaire des RTT (None = perte)
+    def __init__(self, target, history=PROBE_HISTORY):
+        self.target = target
+        self.host, self.port = self.parse_target(target)
+        self.history = deque(maxlen=history)
+
+    @staticmethod
+    def parse_target(target):
+        # "hôte", "hôte:port", "[ipv6]" ou "[ipv6]:port" ; une IPv6 nue n'a jamais de port
+        if target.startswith("["):
+            host, _, rest = target[1:].partition("]")
+            port = rest[1:] if rest.startswith(":") else ""
+            return host, int(port) if port.isdigit() else None
+        host, sep, port = target.rpartition(":")
+        if sep and port.isdigit() and ":" not in host:
+            return host, int(port)
+        return target, None
+
+    async def _tcp_rtt(self):
+        start = time.perf_counter()
+        _, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), PROBE_TIMEOUT)
+        rtt = (time.perf_counter() - start) * 1000
+        writer.close()
+        await writer.wait_closed()
+        return rtt
+
+    async def _icmp_rtt(self):
+        proc = await asyncio.create_subprocess_exec(
+            "ping", "-c", "1", "-W", str(max(1, round(PROBE_TIMEOUT))), self.host,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
         )
-        output = result.stdout
-        if result.returncode == 0:
-            time_ms = output.split("time=")[-1].split(" ")[0]
-            return True, f"{time_ms} ms"
-        else:
-            return False, "unreachable"
-    except:
-        return False, "error"
-last_decoded_lines = []  # Liste des dernières lignes envoyées, à garder pour ne pas envoyer les mêmes
+        try:
+            output, _ = await asyncio.wait_for(proc.communicate(), PROBE_TIMEOUT + 1)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            return None
+        return float(output.decode().split("time=")[-1].split(" ")[0])
+
+    async def probe(self):
+        try:
+            rtt = await (self._tcp_rtt() if self.port else self._icmp_rtt())
+        except (OSError, ValueError, asyncio.TimeoutError):
+            rtt = None
+        self.history.append(rtt)
+        return rtt
+
+    def summary(self):
+        if not self.history:
+            return "pending"
+        last = self.history[-1]
+        rtts = sorted(r for r in self.history if r is not None)
+        loss = round(100 * (len(self.history) - len(rtts)) / len(self.history))
+        text = f"{last:.1f} ms" if last is not None else "unreachable"
+        if rtts:
+            return text + f" (p50 {percentile(rtts, 50):.1f} / p95 {percentile(rtts, 95):.1f} ms, loss {loss}%)"
+        return text + f" (loss {loss}%)"
+
+class Receiver:
+    # Un récepteur OpenWebRX : dossier d'images, flux WSPR/FT8, salons cibles et hôtes sondés.
+    # Tous les récepteurs partagent la boucle, la file d'images et les workers d'envoi.
+    def __init__(self, name, watched_folder, sstv_channel_id, probe_hosts=(), quality_hold_channel_id=0,
+                 wspr_file=None, wspr_channel_id=0, decoded_file=None, decoded_channel_id=0):
+        self.name = name
+        self.watched_folder = watched_folder
+        self.sstv_channel_id = sstv_channel_id
+        self.quality_hold_channel_id = quality_hold_channel_id
+        self.probers = [HostProber(target) for target in probe_hosts]
+        self.watcher = None
+        # Le récepteur par défaut garde les noms de flux d'avant ("wspr", "ft8") et donc leur état
+        prefix = "" if name == DEFAULT_RECEIVER else f"{name}:"
+        suffix = "" if name == DEFAULT_RECEIVER else f" · {name}"
+        self.wspr_feed = self.decoded_feed = None
+        if wspr_file and wspr_channel_id:
+            self.wspr_feed = DecoderFeed(
+                prefix + "wspr", wspr_file, parse_wspr_line, wspr_channel_id, format_wspr_spot,
+                SpotDigest("WSPR" + suffix, format_wspr_digest_line), name
+            )
+        if decoded_file and decoded_channel_id:
+            self.decoded_feed = DecoderFeed(
+                prefix + "ft8", decoded_file, parse_decoded_line, decoded_channel_id, format_ft8_spot,
+                SpotDigest("FT8" + suffix, format_ft8_digest_line), name
+            )
+
+def load_receivers():
+    if not RECEIVERS_FILE:
+        return [Receiver(
+            DEFAULT_RECEIVER, WATCHED_FOLDER, SSTV_CHANNEL_ID, SDR_PROBE_HOSTS, QUALITY_HOLD_CHANNEL_ID,
+            WSPR_FILE_PATH, WSPR_CHANNEL_ID, DECODED_FILE_PATH, DECODED_CHANNEL_ID
+        )]
+    with open(RECEIVERS_FILE) as f:
+        entries = json.load(f)
+    receivers = []
+    for entry in entries:
+        if any(r.name == entry["name"] for r in receivers):
+            raise ValueError(f"Récepteur {entry['name']} défini deux fois dans {RECEIVERS_FILE}")
+        receivers.append(Receiver(
+            entry["name"],
+            entry["watched_folder"],
+            int(entry["sstv_channel_id"]),
+            entry.get("probe_hosts", []),
+            int(entry.get("quality_hold_channel_id") or 0),
+            entry.get("wspr_file"),
+            int(entry.get("wspr_channel_id") or 0),
+            entry.get("decoded_file"),
+            int(entry.get("decoded_channel_id") or 0),
+        ))
+    return receivers
+
+receivers = load_receivers()
+receivers_by_name = {r.name: r for r in receivers}
+wspr_feeds = [r.wspr_feed for r in receivers if r.wspr_feed is not None]
+decoded_feeds = [r.decoded_feed for r in receivers if r.decoded_feed is not None]
+sdr_probers = [(r, prober) for r in receivers for prober in r.probers]
+sstv_channel_ids = {r.sstv_channel_id for r in receivers}
 
 os.makedirs(USER_DATA_DIR, exist_ok=True)
 
+USER_DB_CACHE_SIZE = 64
+USER_DB_IDLE_SECONDS = 300
+SEARCH_PAGE_SIZE = 20
+
+def sqlite_has_fts5():
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+FTS5_AVAILABLE = sqlite_has_fts5()
+
+class UserDatabaseMissing(Exception):
+    pass
+
+def migrate_user_db(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ft_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT,
+                date TEXT,
+                call TEXT,
+                reste TEXT
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS stations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                description TEXT,
+                image_path TEXT
+            )
+        """)
+        version = 1
+    if version < 2 and FTS5_AVAILABLE:
+        # Index plein texte pour /infosear, synchronisé par triggers ; "/" garde les indicatifs
+        # portables (F4ABC/P) en un seul mot, les préfixes de 2 et 3 caractères sont indexés
+        conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS ft_messages_fts USING fts5(
+                type, call, reste, content='ft_messages', content_rowid='id',
+                tokenize="unicode61 tokenchars '/'", prefix='2 3'
+            );
+            CREATE TRIGGER IF NOT EXISTS ft_messages_fts_ai AFTER INSERT ON ft_messages BEGIN
+                INSERT INTO ft_messages_fts (rowid, type, call, reste) VALUES (NEW.id, NEW.type, NEW.call, NEW.reste);
+            END;
+            CREATE TRIGGER IF NOT EXISTS ft_messages_fts_ad AFTER DELETE ON ft_messages BEGIN
+                INSERT INTO ft_messages_fts (ft_messages_fts, rowid, type, call, reste) VALUES ('delete', OLD.id, OLD.type, OLD.call, OLD.reste);
+            END;
+            CREATE TRIGGER IF NOT EXISTS ft_messages_fts_au AFTER UPDATE ON ft_messages BEGIN
+                INSERT INTO ft_messages_fts (ft_messages_fts, rowid, type, call, reste) VALUES ('delete', OLD.id, OLD.type, OLD.call, OLD.reste);
+                INSERT INTO ft_messages_fts (rowid, type, call, reste) VALUES (NEW.id, NEW.type, NEW.call, NEW.reste);
+            END;
+            INSERT INTO ft_messages_fts (ft_messages_fts) VALUES ('rebuild');
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS stations_fts USING fts5(
+                description, content='stations', content_rowid='id', prefix='2 3'
+            );
+            CREATE TRIGGER IF NOT EXISTS stations_fts_ai AFTER INSERT ON stations BEGIN
+                INSERT INTO stations_fts (rowid, description) VALUES (NEW.id, NEW.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS stations_fts_ad AFTER DELETE ON stations BEGIN
+                INSERT INTO stations_fts (stations_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS stations_fts_au AFTER UPDATE ON stations BEGIN
+                INSERT INTO stations_fts (stations_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+                INSERT INTO stations_fts (rowid, description) VALUES (NEW.id, NEW.description);
+            END;
+            INSERT INTO stations_fts (stations_fts) VALUES ('rebuild');
+        """)
+        version = 2
+    if version < 3:
+        # Recherche de doublons (date, indicatif, mode) pour /import
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ft_messages_dedup ON ft_messages (date, call, type)")
+        if version == 2:
+            version = 3
+    if conn.execute("PRAGMA user_version").fetchone()[0] != version:
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+
+def fts_query(query):
+    # Chaque mot devient un préfixe entre guillemets : pas d'injection de syntaxe FTS5
+    words = query.split()
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words)
+
+# section -> (table, colonnes, filtre LIKE sans FTS5, nombre de paramètres du filtre)
+LOGBOOK_SECTIONS = {
+    "ft": ("ft_messages", ["id", "type", "date", "call", "reste"], "type LIKE ? OR call LIKE ? OR reste LIKE ?", 3),
+    "sta": ("stations", ["id", "description"], "description LIKE ?", 1),
+}
+
+def fetch_logbook_page(conn, section, query=None, after=None, before=None, limit=SEARCH_PAGE_SIZE):
+    # Pagination par curseur (keyset) : renvoie [(clé, ligne)] dans l'ordre de lecture,
+    # inversé si on remonte avant "before". Clé = (id,), y compris pour une recherche FTS5 :
+    # trier par rang bm25 obligerait à noter toutes les correspondances avant le LIMIT.
+    table, columns, like_filter, like_params = LOGBOOK_SECTIONS[section]
+    cursor = after if before is None else before
+    op, order = (">", "ASC") if before is None else ("<", "DESC")
+
+    if query and FTS5_AVAILABLE and conn.execute("PRAGMA user_version").fetchone()[0] >= 2:
+        fts = f"{table}_fts"
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = ", ".join(f"t.{c}" for c in columns)
+        sql = f"SELECT {sql} FROM {fts} JOIN {table} t ON t.id = {fts}.rowid WHERE {fts} MATCH ?"
+        params = [match]
+        if cursor is not None:
+            sql += f" AND {fts}.rowid {op} ?"
+            params.append(cursor[0])
+        sql += f" ORDER BY {fts}.rowid {order} LIMIT ?"
+        return [((row[0],), row) for row in conn.execute(sql, params + [limit]).fetchall()]
+
+    where, params = [], []
+    if query:
+        where.append(f"({like_filter})")
+        params.extend([f"%{query}%"] * like_params)
+    if cursor is not None:
+        where.append(f"id {op} ?")
+        params.append(cursor[0])
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY id {order} LIMIT ?"
+    return [((row[0],), row) for row in conn.execute(sql, params + [limit]).fetchall()]
+
+class UserDBPool:
+    # Connexions aux bases privées user_data/<id>/data.db : LRU de connexions ouvertes,
+    # fermées après USER_DB_IDLE_SECONDS d'inactivité, utilisées depuis un pool de threads
+    def __init__(self, capacity=USER_DB_CACHE_SIZE, max_workers=4):
+        self.capacity = capacity
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="user-db")
+        self.lock = threading.Lock()
+        # user_id -> [conn, verrou, dernière utilisation, fermée]. Une entrée peut être évincée entre
+        # _acquire et la prise de son verrou : le drapeau, posé sous ce verrou, oblige _run à recommencer
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def db_path(user_id):
+        return os.path.join(USER_DATA_DIR, str(user_id), "data.db")
+
+    def _open(self, user_id, create):
+        path = self.db_path(user_id)
+        if not create and not os.path.exists(path):
+            raise UserDatabaseMissing(user_id)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        migrate_user_db(conn)
+        return conn
+
+    def _acquire(self, user_id, create):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                self.entries.move_to_end(user_id)
+                entry[2] = time.monotonic()
+                return entry
+        conn = self._open(user_id, create)
+        evicted = []
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                entry = self.entries[user_id] = [conn, threading.Lock(), time.monotonic(), False]
+            else:
+                # Ouverte entre-temps par un autre thread : on garde la sienne
+                conn.close()
+            while len(self.entries) > self.capacity:
+                evicted.append(self.entries.popitem(last=False)[1])
+        for old in evicted:
+            self._close_entry(old)
+        return entry
+
+    @staticmethod
+    def _close_entry(entry):
+        with entry[1]:
+            entry[3] = True
+            entry[0].close()
+
+    def _run(self, user_id, fn, create):
+        while True:
+            entry = self._acquire(user_id, create)
+            with entry[1]:
+                if entry[3]:
+                    continue
+                start = time.perf_counter()
+                try:
+                    result = fn(entry[0])
+                    entry[0].commit()
+                    return result
+                except Exception:
+                    entry[0].rollback()
+                    raise
+                finally:
+                    SQLITE_QUERY_SECONDS.observe(time.perf_counter() - start, db="user", op="query")
+
+    async def run(self, user_id, fn, create=False):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._run, str(user_id), fn, create)
+
+    def _close(self, user_id):
+        with self.lock:
+            entry = self.entries.pop(user_id, None)
+        if entry is not None:
+            self._close_entry(entry)
+
+    async def close(self, user_id):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._close, str(user_id))
+
+    def _evict_idle(self, max_idle):
+        limit = time.monotonic() - max_idle
+        with self.lock:
+            idle = [user_id for user_id, entry in self.entries.items() if entry[2] < limit]
+        for user_id in idle:
+            self._close(user_id)
+
+    async def evict_idle(self, max_idle=USER_DB_IDLE_SECONDS):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self._evict_idle, max_idle)
+
+user_dbs = UserDBPool()
+
+@tasks.loop(seconds=60)
+@timed_task
+async def evict_idle_user_dbs():
+    await user_dbs.evict_idle()
+
 @bot.tree.command(name="log", description="Crée une base de données privée pour vous en MP")
 async def log_command(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     user_dir = os.path.join(USER_DATA_DIR, user_id)
-    db_path = os.path.join(user_dir, "data.db")
 
     if os.path.exists(user_dir):
         await interaction.response.send_message("Vous avez déjà une base de données.", ephemeral=True)
         return
 
     os.makedirs(user_dir)
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE ft_messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            type TEXT,
-            date TEXT,
-            call TEXT,
-            reste TEXT
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE stations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            description TEXT,
-            image_path TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    await user_dbs.run(user_id, lambda conn: None, create=True)
 
     try:
-        await interaction.user.send("🎉 Votre base de données a été créée avec succès ! Vous pouvez maintenant utiliser `/ft`, `/sta`, `/infos`, `/infosear`, `/export`, `/deleteall` et `/del` ici.")
+        await interaction.user.send("🎉 Votre base de données a été créée avec succès ! Vous pouvez maintenant utiliser `/ft`, `/sta`, `/infos`, `/infosear`, `/import`, `/export`, `/deleteall` et `/del` ici.")
         await interaction.response.send_message("📬 Je vous ai envoyé un MP !", ephemeral=True)
     except:
         await interaction.response.send_message("Je n'ai pas réussi à vous envoyer un MP. Activez vos messages privés.", ephemeral=True)
@@ -136,16 +1670,13 @@ async def ft(interaction: discord.Interaction, type: str, date: str, call: str,
         await interaction.response.send_message("Cette commande n'est disponible qu'en MP.", ephemeral=True)
         return
 
-    user_dir = os.path.join(USER_DATA_DIR, str(interaction.user.id))
-    db_path = os.path.join(user_dir, "data.db")
-    if not os.path.exists(db_path):
+    try:
+        await user_dbs.run(interaction.user.id, lambda conn: conn.execute(
+            "INSERT INTO ft_messages (type, date, call, reste) VALUES (?, ?, ?, ?)", (type, date, call, reste)
+        ))
+    except UserDatabaseMissing:
         await interaction.response.send_message("Vous devez d'abord utiliser la commande /log.", ephemeral=True)
         return
-
-    conn = sqlite3.connect(db_path)
-    conn.execute("INSERT INTO ft_messages (type, date, call, reste) VALUES (?, ?, ?, ?)", (type, date, call, reste))
-    conn.commit()
-    conn.close()
     await interaction.response.send_message("✅ Message FT enregistré.")
 
 @bot.tree.command(name="sta", description="Ajoute une station de nombres découverte")
@@ -155,6 +1686,10 @@ async def sta(interaction: discord.Interaction, description: str):
         await interaction.response.send_message("Cette commande n'est disponible qu'en MP.", ephemeral=True)
         return
 
+    if not os.path.exists(UserDBPool.db_path(interaction.user.id)):
+        await interaction.response.send_message("Vous devez d'abord utiliser la commande /log.", ephemeral=True)
+        return
+
     image_path = None
     if interaction.attachments:
         att = interaction.attachments[0]
@@ -163,78 +1698,405 @@ async def sta(interaction: discord.Interaction, description: str):
         image_path = os.path.join(user_dir, att.filename)
         await att.save(image_path)
 
-    db_path = os.path.join(USER_DATA_DIR, str(interaction.user.id), "data.db")
-    conn = sqlite3.connect(db_path)
-    conn.execute("INSERT INTO stations (description, image_path) VALUES (?, ?)", (description, image_path))
-    conn.commit()
-    conn.close()
+    await user_dbs.run(interaction.user.id, lambda conn: conn.execute(
+        "INSERT INTO stations (description, image_path) VALUES (?, ?)", (description, image_path)
+    ))
     await interaction.response.send_message("📡 Station enregistrée.")
 
+PAGE_CHAR_BUDGET = 1800  # limite Discord de 2000 caractères, en-tête compris
+LINE_MAX = 200
+
+def format_logbook_row(section, row):
+    if section == "ft":
+        line = f"{row[0]}. {row[1]} | {row[2]} | {row[3]} | {row[4]}"
+    else:
+        line = f"{row[0]}. {row[1]}"
+    return line if len(line) <= LINE_MAX else line[:LINE_MAX - 1] + "…"
+
+class LogbookPager(discord.ui.View):
+    # Affichage page par page de /infos et /infosear : chaque page est relue à la demande
+    # depuis SQLite à partir des clés de la page affichée, sans rien garder d'autre en mémoire
+    def __init__(self, user_id, query=None):
+        super().__init__(timeout=600)
+        self.user_id = user_id
+        self.query = query
+        self.section = "ft"
+        self.page = 1
+        self.first_key = None
+        self.last_key = None
+
+    def header(self):
+        name = "FT" if self.section == "ft" else "Stations"
+        if self.query:
+            return f"**{name} (resultats, page {self.page}):**\n"
+        return f"**{'FT Messages' if self.section == 'ft' else 'Stations'} (page {self.page}):**\n"
+
+    async def load(self, after=None, before=None):
+        section, query = self.section, self.query
+        rows = await user_dbs.run(self.user_id, lambda conn: fetch_logbook_page(
+            conn, section, query, after, before, SEARCH_PAGE_SIZE + 1
+        ))
+        more = len(rows) > SEARCH_PAGE_SIZE
+        keys, lines, size = [], [], 0
+        for key, row in rows[:SEARCH_PAGE_SIZE]:
+            line = format_logbook_row(section, row)
+            if size + len(line) + 1 > PAGE_CHAR_BUDGET:
+                more = True
+                break
+            keys.append(key)
+            lines.append(line)
+            size += len(line) + 1
+        if before is not None:
+            keys.reverse()
+            lines.reverse()
+            has_prev, has_next = more, True
+        else:
+            has_prev, has_next = after is not None, more
+
+        if keys:
+            self.first_key, self.last_key = keys[0], keys[-1]
+        self.previous_page.disabled = not has_prev
+        self.next_page.disabled = not has_next
+        self.switch_section.label = "📡 Stations" if section == "ft" else "📻 FT"
+        if not lines:
+            return self.header() + ("Aucun résultat." if query else "Rien enregistré.")
+        return self.header() + "\n".join(lines)
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.user_id
+
+    @discord.ui.button(label="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(1, self.page - 1)
+        content = await self.load(before=self.first_key)
+        await interaction.response.edit_message(content=content, view=self)
+
+    @discord.ui.button(label="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        content = await self.load(after=self.last_key)
+        await interaction.response.edit_message(content=content, view=self)
+
+    @discord.ui.button(label="📡 Stations", style=discord.ButtonStyle.primary)
+    async def switch_section(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.section = "sta" if self.section == "ft" else "ft"
+        self.page = 1
+        self.first_key = self.last_key = None
+        content = await self.load()
+        await interaction.response.edit_message(content=content, view=self)
+
 @bot.tree.command(name="infos", description="Affiche tout ce qui est enregistré dans votre base")
 async def infos(interaction: discord.Interaction):
     if interaction.guild:
         await interaction.response.send_message("Cette commande n'est disponible qu'en MP.", ephemeral=True)
         return
 
-    db_path = os.path.join(USER_DATA_DIR, str(interaction.user.id), "data.db")
-    if not os.path.exists(db_path):
+    pager = LogbookPager(interaction.user.id)
+    try:
+        content = await pager.load()
+    except UserDatabaseMissing:
         await interaction.response.send_message("Aucune base trouvée. Utilisez d'abord /log", ephemeral=True)
         return
-
-    conn = sqlite3.connect(db_path)
-    ft_rows = conn.execute("SELECT * FROM ft_messages").fetchall()
-    stations = conn.execute("SELECT * FROM stations").fetchall()
-    conn.close()
-
-    msg = f"**FT Messages:**\n"
-    for r in ft_rows:
-        msg += f"{r[0]}. {r[1]} | {r[2]} | {r[3]} | {r[4]}\n"
-    msg += "\n**Stations:**\n"
-    for s in stations:
-        msg += f"{s[0]}. {s[1]}\n"
-    await interaction.response.send_message(msg or "Rien enregistré.")
+    await interaction.response.send_message(content, view=pager)
 
 @bot.tree.command(name="infosear", description="Recherche dans votre base")
-@app_commands.describe(query="Mot à rechercher")
+@app_commands.describe(query="Mot à rechercher (début d'indicatif accepté)")
 async def infosear(interaction: discord.Interaction, query: str):
     if interaction.guild:
         await interaction.response.send_message("Cette commande n'est disponible qu'en MP.", ephemeral=True)
         return
 
-    db_path = os.path.join(USER_DATA_DIR, str(interaction.user.id), "data.db")
-    conn = sqlite3.connect(db_path)
-    ft_rows = conn.execute("SELECT * FROM ft_messages WHERE type LIKE ? OR call LIKE ? OR reste LIKE ?", (f"%{query}%",)*3).fetchall()
-    stations = conn.execute("SELECT * FROM stations WHERE description LIKE ?", (f"%{query}%",)).fetchall()
-    conn.close()
-
-    msg = f"**FT (resultats):**\n"
-    for r in ft_rows:
-        msg += f"{r[0]}. {r[1]} | {r[2]} | {r[3]} | {r[4]}\n"
-    msg += "\n**Stations (resultats):**\n"
-    for s in stations:
-        msg += f"{s[0]}. {s[1]}\n"
-    await interaction.response.send_message(msg or "Aucun résultat.")
+    pager = LogbookPager(interaction.user.id, query)
+    try:
+        content = await pager.load()
+    except UserDatabaseMissing:
+        await interaction.response.send_message("Aucune base trouvée. Utilisez d'abord /log", ephemeral=True)
+        return
+    await interaction.response.send_message(content, view=pager)
+
+DISCORD_UPLOAD_LIMIT = 10 * 1024 * 1024
+EXPORT_PART_BYTES = int(os.getenv("EXPORT_PART_BYTES", str(8 * 1024 * 1024)))  # marge sous DISCORD_UPLOAD_LIMIT
+USER_DB_FILES = ("data.db", "data.db-wal", "data.db-shm")
+
+def adif_field(name, value):
+    value = str(value)
+    return f"<{name}:{len(value.encode('utf-8'))}>{value} "
+
+def adif_mode(ft_type):
+    mode = str(ft_type).strip().upper()
+    return mode if mode.startswith("FT") else f"FT{mode}"
+
+def adif_date(value):
+    # Les dates saisies dans /ft sont libres : AAAAMMJJ, AAMMJJ (format WSJT-X) ou JJ/MM/AAAA,
+    # éventuellement suivies de l'heure HHMM (lignes importées par /import)
+    words = str(value).split()
+    if not words:
+        return None, None
+    digits = "".join(ch for ch in words[0] if ch.isdigit())
+    time_on = words[1] if len(words) > 1 and words[1].isdigit() and len(words[1]) in (4, 6) else None
+    if len(digits) == 8 and "/" in words[0]:
+        return digits[4:] + digits[2:4] + digits[:2], time_on
+    if len(digits) == 8:
+        return digits, time_on
+    if len(digits) == 6:
+        return "20" + digits, time_on
+    return None, None
+
+def write_logbook_exports(snapshot_path, out_dir):
+    # CSV des deux tables et ADIF des messages FT, lus ligne à ligne depuis l'instantané
+    conn = sqlite3.connect(snapshot_path)
+    paths = []
+    try:
+        for table in ("ft_messages", "stations"):
+            path = os.path.join(out_dir, f"{table}.csv")
+            cursor = conn.execute(f"SELECT * FROM {table} ORDER BY id")
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow([col[0] for col in cursor.description])
+                writer.writerows(cursor)
+            paths.append((f"{table}.csv", path))
+
+        path = os.path.join(out_dir, "logbook.adi")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("Export SSTV bot\n" + adif_field("ADIF_VER", "3.1.4") + adif_field("PROGRAMID", "sstv-bot") + "<EOH>\n")
+            for ft_type, ft_date, call, reste in conn.execute("SELECT type, date, call, reste FROM ft_messages ORDER BY id"):
+                record = adif_field("CALL", call) + adif_field("MODE", adif_mode(ft_type))
+                qso_date, time_on = adif_date(ft_date)
+                if qso_date:
+                    record += adif_field("QSO_DATE", qso_date)
+                if time_on:
+                    record += adif_field("TIME_ON", time_on)
+                if reste:
+                    record += adif_field("COMMENT", reste)
+                f.write(record + "<EOR>\n")
+        paths.append(("logbook.adi", path))
+    finally:
+        conn.close()
+    return paths
+
+def build_export_archives(user_dir, snapshot_path, out_dir, compact, part_bytes=EXPORT_PART_BYTES):
+    # Écrit une ou plusieurs archives zip d'au plus part_bytes chacune, chaque partie restant
+    # lisible seule ; les fichiers sont copiés par blocs dans l'archive, sans tout charger en mémoire
+    entries = write_logbook_exports(snapshot_path, out_dir)
+    if not compact:
+        entries.insert(0, ("data.db", snapshot_path))
+        for root, _, files in os.walk(user_dir):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if root == user_dir and name in USER_DB_FILES:
+                    continue
+                entries.append((os.path.relpath(path, user_dir), path))
+
+    parts = []
+    archive = None
+    current = 0
+    for arcname, path in entries:
+        size = os.path.getsize(path)
+        if archive is None or (current and current + size > part_bytes):
+            if archive is not None:
+                archive.close()
+            parts.append(os.path.join(out_dir, f"part{len(parts) + 1}.zip"))
+            archive = zipfile.ZipFile(parts[-1], "w", zipfile.ZIP_DEFLATED)
+            current = 0
+        archive.write(path, arcname)
+        current += archive.getinfo(arcname).compress_size + len(arcname) + 100
+    if archive is not None:
+        archive.close()
+    return parts
+
+def snapshot_user_db(conn, dest_path):
+    # API de sauvegarde SQLite : copie cohérente même si des écritures sont en cours
+    dest = sqlite3.connect(dest_path)
+    try:
+        conn.backup(dest)
+    finally:
+        dest.close()
 
 @bot.tree.command(name="export", description="Exportez votre base de données et images dans un fichier zip")
-async def export(interaction: discord.Interaction):
+@app_commands.describe(mode="complet (base + images) ou compact (CSV/ADIF seulement)")
+@app_commands.choices(mode=[
+    app_commands.Choice(name="complet", value="full"),
+    app_commands.Choice(name="compact (CSV/ADIF)", value="compact"),
+])
+async def export(interaction: discord.Interaction, mode: str = "full"):
     if interaction.guild:
         await interaction.response.send_message("Commande disponible uniquement en MP.", ephemeral=True)
         return
 
-    user_dir = os.path.join(USER_DATA_DIR, str(interaction.user.id))
+    user_id = str(interaction.user.id)
+    user_dir = os.path.join(USER_DATA_DIR, user_id)
     if not os.path.exists(user_dir):
         await interaction.response.send_message("Aucune base trouvée. Utilisez d'abord /log.", ephemeral=True)
         return
 
-    zip_path = os.path.join(USER_DATA_DIR, f"export_{interaction.user.id}.zip")
-    shutil.make_archive(zip_path.replace(".zip", ""), 'zip', user_dir)
-    await interaction.response.send_message("Voici votre export :", file=discord.File(zip_path))
-    os.remove(zip_path)
+    await interaction.response.defer(thinking=True)
+    loop = asyncio.get_running_loop()
+    # Dossier temporaire propre à cette demande : deux exports simultanés ne se marchent pas dessus
+    tmp_dir = tempfile.mkdtemp(prefix=f"export_{user_id}_")
+    try:
+        snapshot_path = os.path.join(tmp_dir, "data.db")
+        try:
+            await user_dbs.run(user_id, lambda conn: snapshot_user_db(conn, snapshot_path))
+        except UserDatabaseMissing:
+            await interaction.followup.send("Aucune base trouvée. Utilisez d'abord /log.")
+            return
+
+        parts = await loop.run_in_executor(
+            user_dbs.executor, build_export_archives, user_dir, snapshot_path, tmp_dir, mode == "compact"
+        )
+        for index, part in enumerate(parts, start=1):
+            if len(parts) == 1:
+                name, text = f"export_{user_id}.zip", "Voici votre export :"
+            else:
+                name, text = f"export_{user_id}_part{index}.zip", f"Voici votre export (partie {index}/{len(parts)}) :"
+            if os.path.getsize(part) > DISCORD_UPLOAD_LIMIT:
+                await interaction.followup.send(f"⚠️ Partie {index}/{len(parts)} trop volumineuse pour Discord (un fichier dépasse la limite d'envoi). Essayez `/export mode:compact`.")
+                continue
+            await interaction.followup.send(text, file=discord.File(part, filename=name))
+    finally:
+        await loop.run_in_executor(None, shutil.rmtree, tmp_dir, True)
+
+IMPORT_BATCH_SIZE = 10000
+IMPORT_PROGRESS_SECONDS = 2
+ADIF_TAG = re.compile(r"<([A-Za-z0-9_]+)(?::(\d+)(?::[A-Za-z])?)?>")
+
+def iter_adif_records(f, chunk_size=64 * 1024):
+    # Lecture ADIF en flux : f est ouvert en latin-1 pour que les longueurs (en octets) tombent juste
+    buf, pos, record = "", 0, {}
+    while True:
+        m = ADIF_TAG.search(buf, pos)
+        if m is None or (m.group(2) and m.end() + int(m.group(2)) > len(buf)):
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            if m is None:
+                # Ne garder qu'un éventuel début de balise coupé par le bloc précédent
+                cut = buf.rfind("<", pos)
+                pos = cut if cut >= 0 else len(buf)
+            else:
+                pos = m.start()
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        name = m.group(1).upper()
+        pos = m.end()
+        if m.group(2):
+            value = buf[pos:pos + int(m.group(2))]
+            pos += len(value)
+            record[name] = value.encode("latin-1").decode("utf-8", errors="replace")
+        elif name == "EOH":
+            record = {}
+        elif name == "EOR":
+            yield record
+            record = {}
+
+def adif_to_ft_row(record):
+    call = record.get("CALL", "").strip().upper()
+    if not call:
+        return None
+    mode = record.get("MODE", "").strip().upper()
+    if mode == "MFSK" and record.get("SUBMODE"):
+        mode = record["SUBMODE"].strip().upper()
+    ft_type = mode[2:] if mode.startswith("FT") else mode
+    qso_date = (record.get("QSO_DATE", "").strip() + " " + record.get("TIME_ON", "").strip()[:4]).strip()
+    extras = [record.get(key, "").strip() for key in ("GRIDSQUARE", "RST_SENT", "RST_RCVD", "BAND", "FREQ", "COMMENT")]
+    return ft_type, qso_date, call, " ".join(e for e in extras if e)
+
+def all_txt_to_ft_row(line):
+    # Format WSJT-X : "250411_175000    14.074 Rx FT8    -12  0.2 1234 CQ F4ABC JN18"
+    parts = line.split()
+    if len(parts) < 9 or "_" not in parts[0] or parts[2] not in ("Rx", "Tx"):
+        return None
+    day, _, hms = parts[0].partition("_")
+    mode, snr, freq, message = parts[3].upper(), parts[4], parts[1], parts[7:]
+    if message[0] == "CQ":
+        # "CQ F4ABC JN18" ou "CQ DX F4ABC JN18" : l'indicatif précède le locator
+        call = message[-2] if len(message) >= 3 and re.fullmatch(r"[A-R]{2}\d{2}", message[-1]) else message[-1]
+    elif len(message) >= 2:
+        call = message[1]
+    else:
+        return None
+    call = call.strip("<>").upper()
+    ft_type = mode[2:] if mode.startswith("FT") else mode
+    return ft_type, f"20{day} {hms[:4]}", call, f"{' '.join(message)} {snr} dB {freq} MHz"
+
+def iter_import_rows(path):
+    with open(path, "rb") as f:
+        head = f.read(4096).lower()
+    if b"<eoh>" in head or b"<call:" in head or b"<eor>" in head:
+        with open(path, "r", encoding="latin-1") as f:
+            for record in iter_adif_records(f):
+                row = adif_to_ft_row(record)
+                if row:
+                    yield row
+    else:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                row = all_txt_to_ft_row(line)
+                if row:
+                    yield row
+
+def insert_ft_rows(conn, rows):
+    # Doublon = même (date, indicatif, mode), y compris à l'intérieur du lot
+    cursor = conn.executemany("""
+        INSERT INTO ft_messages (type, date, call, reste)
+        SELECT ?1, ?2, ?3, ?4
+        WHERE NOT EXISTS (SELECT 1 FROM ft_messages WHERE date = ?2 AND call = ?3 AND type = ?1)
+    """, rows)
+    return cursor.rowcount
+
+@bot.tree.command(name="import", description="Importe un journal ADIF ou un ALL.TXT de WSJT-X dans votre base")
+@app_commands.describe(fichier="Fichier .adi/.adif ou ALL.TXT")
+async def import_logbook(interaction: discord.Interaction, fichier: discord.Attachment):
+    if interaction.guild:
+        await interaction.response.send_message("Commande disponible uniquement en MP.", ephemeral=True)
+        return
+
+    user_id = str(interaction.user.id)
+    if not os.path.exists(UserDBPool.db_path(user_id)):
+        await interaction.response.send_message("Aucune base trouvée. Utilisez d'abord /log.", ephemeral=True)
+        return
+
+    await interaction.response.defer(thinking=True)
+    loop = asyncio.get_running_loop()
+    tmp_dir = tempfile.mkdtemp(prefix=f"import_{user_id}_")
+    try:
+        # Téléchargement par blocs : le fichier n'est jamais entièrement en mémoire
+        path = os.path.join(tmp_dir, "import.txt")
+        async with aiohttp.ClientSession() as session:
+            async with session.get(fichier.url) as resp:
+                resp.raise_for_status()
+                with open(path, "wb") as f:
+                    async for chunk in resp.content.iter_chunked(64 * 1024):
+                        f.write(chunk)
+
+        progress = await interaction.followup.send("📥 Import en cours…", wait=True)
+        rows = iter_import_rows(path)
+        parsed = inserted = 0
+        last_report = time.monotonic()
+        while True:
+            batch = await loop.run_in_executor(user_dbs.executor, lambda: list(itertools.islice(rows, IMPORT_BATCH_SIZE)))
+            if not batch:
+                break
+            # Un lot = une transaction (commit fait par le pool)
+            inserted += await user_dbs.run(user_id, lambda conn: insert_ft_rows(conn, batch))
+            parsed += len(batch)
+            if time.monotonic() - last_report >= IMPORT_PROGRESS_SECONDS:
+                last_report = time.monotonic()
+                await progress.edit(content=f"📥 Import en cours… {parsed} lignes lues, {inserted} ajoutées")
+
+        await progress.edit(content=f"✅ Import terminé : {parsed} QSO lus, {inserted} ajoutés, {parsed - inserted} doublons ignorés.")
+    except Exception as e:
+        logging.error(f"Échec de l'import pour {user_id}: {e}", exc_info=True)
+        await interaction.followup.send("❌ L'import a échoué. Vérifiez que le fichier est un ADIF ou un ALL.TXT valide.")
+    finally:
+        await loop.run_in_executor(None, shutil.rmtree, tmp_dir, True)
 
 @bot.tree.command(name="deleteall", description="Supprime toute votre base de données et fichiers")
 async def deleteall(interaction: discord.Interaction):
     user_dir = os.path.join(USER_DATA_DIR, str(interaction.user.id))
     if os.path.exists(user_dir):
+        await user_dbs.close(interaction.user.id)
         shutil.rmtree(user_dir)
         await interaction.response.send_message("🗑️ Tous vos données ont été supprimées.")
     else:
@@ -252,89 +2114,84 @@ async def delete(interaction: discord.Interaction, categorie: str, id: int):
         await interaction.response.send_message("Catégorie invalide. Utilisez ft ou sta.", ephemeral=True)
         return
 
-    db_path = os.path.join(USER_DATA_DIR, str(interaction.user.id), "data.db")
-    if not os.path.exists(db_path):
+    try:
+        await user_dbs.run(interaction.user.id, lambda conn: conn.execute(f"DELETE FROM {table} WHERE id = ?", (id,)))
+    except UserDatabaseMissing:
         await interaction.response.send_message("Aucune base trouvée. Utilisez /log.", ephemeral=True)
         return
-
-    conn = sqlite3.connect(db_path)
-    conn.execute(f"DELETE FROM {table} WHERE id = ?", (id,))
-    conn.commit()
-    conn.close()
     await interaction.response.send_message(f"Entrée {id} supprimée de {categorie}.")
 
+@tasks.loop(seconds=10)
+@timed_task
 async def monitor_decoded_file():
-    global last_decoded_lines
-    try:
-        if not os.path.exists(DECODED_FILE_PATH):
-            return
-
-        with open(DECODED_FILE_PATH, "r") as f:
-            lines = f.readlines()
-
-        lines = [line.strip() for line in lines if line.strip()]
-        new_lines = [line for line in lines if line not in last_decoded_lines]
-        last_decoded_lines = lines[-100:]  # Garder les 100 dernières lignes
-
-        if not new_lines:
-            return  # Si aucune nouvelle ligne, ne rien faire
-
-        channel = bot.get_channel(DECODED_CHANNEL_ID)
-        if not channel:
-            return
-
-        for line in new_lines:
-            parts = line.split()
-            if len(parts) >= 7:  # Vérifier qu'il y a suffisamment d'éléments pour traiter la ligne
-                date_time_str = parts[0]  # La première valeur est un identifiant temporel
-                try:
-                    # Formater la date et l'heure en objet datetime pour comparaison
-                    message_datetime = datetime.strptime(date_time_str, "%d%m%y")
-                    
-                    # Vérifier si la date est plus ancienne que celle du dernier message envoyé
-                    if last_sent_datetime and message_datetime <= last_sent_datetime:
-                        continue  # Ignorer si la date est antérieure ou égale à la dernière envoyée
-
-                    # Mettre à jour la dernière date et heure envoyée
-                    last_sent_datetime = message_datetime
-                    save_last_sent_datetime(last_sent_datetime)  # Sauvegarder la nouvelle date
-
-                    # Traitement du message FT8
-                    callsign_from = parts[-3]  # Callsign de l'émetteur
-                    callsign_to = parts[-2]  # Callsign du récepteur
-                    mode = parts[-1]  # Mode (FT8 dans ce cas)
-
-                    message = (
-                        f"📡 Nouveau message FT8 reçu :\n"
-                        f"```{line}```\n"
-                        f"🔗 QRZ (Emetteur) : [**{callsign_from}**](https://www.qrz.com/db/{callsign_from})\n"
-                        f"🔗 QRZ (Récepteur) : [**{callsign_to}**](https://www.qrz.com/db/{callsign_to})"
-                    )
-                    await channel.send(message)  # Envoi du message formaté
-
-                except ValueError:
-                    logging.error(f"Erreur de format de date dans la ligne FT8: {line}")
-
-    except Exception as e:
-        logging.error(f"Erreur dans monitor_decoded_file: {e}")
-        
-async def handle_new_file(filename):
-    filepath = os.path.join(WATCHED_FOLDER, filename)
-
-    if not filename.lower().endswith(".png") or not filename.startswith("SSTV-"):
+    await process_feeds(decoded_feeds, "monitor_decoded_file")
+
+class WindowLimiter:
+    # Limiteur à fenêtre glissante côté client : au plus "limit" passages sur toute fenêtre
+    # de "window" secondes. Un seau à jetons (1/s, rafale 5) laissait passer ~10 envois en 5 s.
+    def __init__(self, limit, window, kind="send"):
+        self.limit = limit
+        self.window = window
+        self.kind = kind
+        self.times = deque(maxlen=limit)
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        start = time.monotonic()
+        async with self.lock:
+            while len(self.times) == self.limit:
+                wait = self.times[0] + self.window - time.monotonic()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            now = time.monotonic()
+            self.times.append(now)
+            BUCKET_WAIT_SECONDS.observe(now - start, kind=self.kind)
+
+# Limites Discord par salon : 5 messages / 5 s, et une réaction toutes les 250 ms.
+# discord.py gère déjà les en-têtes X-RateLimit et les 429 ; ces limiteurs évitent d'en arriver là.
+# La marge sur chaque fenêtre absorbe la gigue de latence entre le bot et Discord.
+CHANNEL_LIMITS = {"send": (5, 5.25), "react": (1, 0.35)}
+channel_buckets = {}
+
+def channel_bucket(channel_id, kind):
+    key = (channel_id, kind)
+    if key not in channel_buckets:
+        channel_buckets[key] = WindowLimiter(*CHANNEL_LIMITS[kind], kind)
+    return channel_buckets[key]
+
+async def wait_until_stable(filepath):
+    # Attend que la taille du fichier ne bouge plus (écriture terminée par OpenWebRX)
+    deadline = time.monotonic() + STABLE_CHECK_TIMEOUT
+    last_size = -1
+    while time.monotonic() < deadline:
+        try:
+            size = os.stat(filepath).st_size
+        except FileNotFoundError:
+            return False
+        if size > 0 and size == last_size:
+            return True
+        last_size = size
+        await asyncio.sleep(STABLE_CHECK_INTERVAL)
+    logging.warning(f"{filepath} est toujours en cours d'écriture, envoi quand même")
+    return True
+
+async def handle_new_file(receiver, filename):
+    filepath = os.path.join(receiver.watched_folder, filename)
+
+    if not is_sstv_file(filename):
         return
 
-    if not os.path.exists(filepath):
+    if not await wait_until_stable(filepath):
         return
 
-    await asyncio.sleep(1)
-
     try:
+        written_at = os.path.getmtime(filepath)
         parts = filename.split('-')
         freq = parts[-1].split('.')[0] if len(parts) >= 2 else "Unknown"
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        channel = bot.get_channel(SSTV_CHANNEL_ID)
+        channel = bot.get_channel(receiver.sstv_channel_id)
         if channel is None:
             return
 
@@ -344,89 +2201,223 @@ async def handle_new_file(filename):
             f"**Frequency**: {freq} kHz\n"
             f"**Time**: {now}"
         )
-
-        file = discord.File(filepath, filename=filename)
-        message = await channel.send(content=content, file=file)
-
-        await asyncio.sleep(0.5)
+        if len(receivers) > 1:
+            content += f"\n**Receiver**: {receiver.name}"
+
+        with tempfile.TemporaryDirectory(prefix="sstv-") as tmp_dir:
+            upload_path, preview_path, phash, score = await prepare_image(filepath, tmp_dir)
+
+            low_quality = score is not None and score < QUALITY_THRESHOLD and QUALITY_ACTION != "off"
+            if low_quality and QUALITY_ACTION == "reject":
+                logging.info(f"{filename} rejeté automatiquement (qualité {score})")
+                await db.execute(
+                    "INSERT INTO sstv_events (filename, timestamp, validated, quality, receiver) VALUES (?, ?, 0, ?, ?)",
+                    (filename, now, score, receiver.name)
+                )
+                await refresh_stats_snapshot()
+                return
+            if low_quality:
+                content += f"\n⚠️ Low quality (score {score:g})"
+                channel = bot.get_channel(receiver.quality_hold_channel_id) or channel
+
+            original_id = None
+            if phash is not None and DEDUP_MODE != "off" and not low_quality:
+                original_id = image_index.find_duplicate(phash, receiver.name)
+            if original_id and DEDUP_MODE == "suppress":
+                logging.info(f"{filename} ignoré : quasi-doublon d'une image récente")
+                return
+
+            await channel_bucket(channel.id, "send").acquire()
+            if original_id:
+                # Quasi-doublon : simple aperçu en réponse au post d'origine
+                file = discord.File(preview_path, filename=os.path.basename(preview_path))
+                message = await channel.send(
+                    content=content + "\n🔁 Near-duplicate of an earlier image",
+                    file=file,
+                    reference=channel.get_partial_message(original_id).to_reference(fail_if_not_exists=False),
+                    mention_author=False
+                )
+            else:
+                file = discord.File(upload_path, filename=os.path.basename(upload_path))
+                message = await channel.send(content=content, file=file)
+            FILE_TO_POST_SECONDS.observe(max(0.0, time.time() - written_at))
+
+        # Enregistré avant les réactions pour qu'un clic immédiat retrouve l'événement
+        event_id = await db.run(lambda conn: conn.execute(
+            "INSERT INTO sstv_events (filename, timestamp, validated, message_id, quality, receiver) VALUES (?, ?, NULL, ?, ?, ?)",
+            (filename, now, message.id, score, receiver.name)
+        ).lastrowid)
+        remember_message_event(message.id, event_id)
+        if phash is not None and not low_quality:
+            await image_index.add(event_id, phash, original_id or message.id, receiver.name)
+        await refresh_stats_snapshot()
+
+        await channel_bucket(channel.id, "react").acquire()
         await message.add_reaction("✅")
-        await asyncio.sleep(0.5)
+        await channel_bucket(channel.id, "react").acquire()
         await message.add_reaction("❌")
 
-        c.execute("INSERT INTO sstv_events (filename, timestamp, validated) VALUES (?, ?, NULL)", (filename, now))
-        conn.commit()
-
     except Exception as e:
         logging.error(f"Failed to handle file {filename}: {e}", exc_info=True)
 
+def command_tree_hash():
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    return hashlib.sha256(json.dumps([bot.application_id, payload], sort_keys=True, default=str).encode()).hexdigest()
+
 @bot.event
 async def on_ready():
+    # Appelé aussi à chaque reconnexion de la gateway : rien ne doit être refait deux fois
     logging.info(f"Logged in as {bot.user.name}")
-    await bot.tree.sync()
+    tree_hash = command_tree_hash()
+    if runtime_state.get("command_tree_hash") != tree_hash:
+        await bot.tree.sync()
+        runtime_state.set("command_tree_hash", tree_hash)
+        logging.info("Commandes slash synchronisées")
     await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.streaming, name="The Ai Oshino Websdr", url="https://twitch.tv/kik07L"))
-    monitor_folder.start()
-    update_stats_message.start()
-    ping_watcher.start()
-    monitor_wspr_file.start()
+    await start_folder_watcher()
+    for loop in (update_stats_message, ping_watcher, monitor_wspr_file, monitor_decoded_file, evict_idle_user_dbs, retention_job):
+        if not loop.is_running():
+            loop.start()
+    await start_metrics_server()
+
+# message_id Discord -> id dans sstv_events, pour valider sans refaire de fetch_message
+message_events = OrderedDict()
+
+def remember_message_event(message_id, event_id):
+    message_events[message_id] = event_id
+    message_events.move_to_end(message_id)
+    if len(message_events) > MESSAGE_CACHE_SIZE:
+        message_events.popitem(last=False)
+
+async def lookup_message_event(message_id):
+    if message_id in message_events:
+        message_events.move_to_end(message_id)
+        return message_events[message_id]
+    row = await db.fetchone("SELECT id FROM sstv_events WHERE message_id = ?", (message_id,))
+    if row is None:
+        return None
+    remember_message_event(message_id, row[0])
+    return row[0]
 
 @bot.event
 async def on_raw_reaction_add(payload):
     if payload.user_id == bot.user.id:
         return
 
+    emoji = str(payload.emoji)
+    if emoji not in ("✅", "❌"):
+        return
+
+    # Les réactions sur des messages qui ne sont pas au bot sont ignorées sans appel API
+    if payload.message_author_id is not None and payload.message_author_id != bot.user.id:
+        return
+
+    validated = 1 if emoji == "✅" else 0
     channel = bot.get_channel(payload.channel_id)
-    message = await channel.fetch_message(payload.message_id)
+    if channel is None:
+        return
 
-    if str(payload.emoji) == "❌":
-        await message.delete()
-        c.execute("UPDATE sstv_events SET validated = 0 WHERE filename = ?", (extract_filename(message),))
-        conn.commit()
+    event_id = await lookup_message_event(payload.message_id)
+    if event_id is None:
+        # Anciens posts enregistrés sans message_id : on retombe sur le nom du fichier joint
+        if payload.channel_id not in sstv_channel_ids:
+            return
+        message = await channel.fetch_message(payload.message_id)
+        if message.author != bot.user:
+            return
+        filename = extract_filename(message)
+        if not filename:
+            return
+        await db.execute("UPDATE sstv_events SET validated = ?, message_id = ? WHERE filename = ?", (validated, message.id, filename))
+    else:
+        message = channel.get_partial_message(payload.message_id)
+        await db.execute("UPDATE sstv_events SET validated = ? WHERE id = ?", (validated, event_id))
 
-    elif str(payload.emoji) == "✅":
+    if validated:
         await message.clear_reactions()
-        c.execute("UPDATE sstv_events SET validated = 1 WHERE filename = ?", (extract_filename(message),))
-        conn.commit()
+    else:
+        await image_index.remove(event_id, message.id)
+        await message.delete()
+    await refresh_stats_snapshot()
+
+async def sstv_consumer():
+    while True:
+        receiver, filename = await sstv_queue.get()
+        filepath = os.path.join(receiver.watched_folder, filename)
+        try:
+            if filepath in in_flight_files:
+                continue
+            # Réservé avant tout await pour qu'un autre worker ne prenne pas le même fichier
+            in_flight_files.add(filepath)
+            try:
+                if not await seen_index.contains(receiver.watched_folder, filename):
+                    await handle_new_file(receiver, filename)
+                    await seen_index.add(receiver.watched_folder, filename)
+            finally:
+                in_flight_files.discard(filepath)
+        finally:
+            sstv_queue.task_done()
+
+async def start_folder_watcher():
+    loop = asyncio.get_running_loop()
+    if not sstv_consumer_tasks:
+        sstv_consumer_tasks.extend(loop.create_task(sstv_consumer()) for _ in range(UPLOAD_WORKERS))
+    if any(r.watcher is not None for r in receivers) or monitor_folder.is_running():
+        return
+
+    for receiver in receivers:
+        # Fichiers arrivés pendant que le bot était arrêté
+        await enqueue_existing_files(receiver)
+
+        if WATCH_MODE != "poll":
+            watcher = InotifyWatcher(receiver, sstv_queue)
+            try:
+                watcher.start(loop)
+                receiver.watcher = watcher
+                logging.info(f"Surveillance inotify de {receiver.watched_folder} ({receiver.name})")
+            except (OSError, AttributeError, NotImplementedError) as e:
+                logging.warning(f"inotify indisponible pour {receiver.watched_folder} ({e}), retour au polling")
+
+    if any(r.watcher is None for r in receivers):
+        monitor_folder.start()
 
 @tasks.loop(seconds=3)
+@timed_task
 async def monitor_folder():
-    files = os.listdir(WATCHED_FOLDER)
-    new_files = set(files) - seen_files
-    for f in new_files:
-        await handle_new_file(f)
-    seen_files.update(new_files)
+    # Seulement les récepteurs sans inotify
+    for receiver in receivers:
+        if receiver.watcher is None:
+            await enqueue_existing_files(receiver)
 
 @tasks.loop(seconds=30)
+@timed_task
 async def ping_watcher():
-    global ping_cache, ping_last_time
-    ok, result = ping(SDR_PING_HOST)
-    ping_cache.clear()
-    ping_cache.append((ok, result))
+    global ping_last_time
+    await asyncio.gather(*(prober.probe() for _, prober in sdr_probers))
     ping_last_time = time.time()
 
 @tasks.loop(seconds=15)
+@timed_task
 async def update_stats_message():
-    global stats_message
-
-    today = date.today().isoformat()
-    c.execute("SELECT COUNT(*) FROM sstv_events WHERE DATE(timestamp) = ?", (today,))
-    total_today = c.fetchone()[0]
-
-    c.execute("SELECT COUNT(*) FROM sstv_events WHERE DATE(timestamp) = ? AND validated = 1", (today,))
-    approved_today = c.fetchone()[0]
-
-    c.execute("SELECT COUNT(*) FROM sstv_events WHERE DATE(timestamp) = ? AND validated = 0", (today,))
-    rejected_today = c.fetchone()[0]
-
-    c.execute("SELECT COUNT(*) FROM sstv_events WHERE validated = 1")
-    total_approved = c.fetchone()[0]
-
-    c.execute("SELECT COUNT(*) FROM sstv_events WHERE validated = 0")
-    total_rejected = c.fetchone()[0]
-
-    c.execute("SELECT MAX(timestamp) FROM sstv_events")
-    last_sstv = c.fetchone()[0] or "Never"
-
-    sdr_ok, sdr_ping = ping_cache[0] if ping_cache else (False, "pending")
+    global stats_message, stats_content
+
+    if sstv_stats["day"] != date.today().isoformat():
+        await refresh_stats_snapshot()
+    total_today = sstv_stats["total_today"]
+    approved_today = sstv_stats["approved_today"]
+    rejected_today = sstv_stats["rejected_today"]
+    total_approved = sstv_stats["total_approved"]
+    total_rejected = sstv_stats["total_rejected"]
+    last_sstv = sstv_stats["last_sstv"] or "Never"
+
+    if len(sdr_probers) == 1:
+        sdr_ping_lines = f"📶 SDR Ping: `{sdr_probers[0][1].summary()}`\n"
+    elif len(receivers) == 1:
+        sdr_ping_lines = "".join(f"📶 SDR `{prober.target}`: `{prober.summary()}`\n" for _, prober in sdr_probers)
+    else:
+        sdr_ping_lines = "".join(
+            f"📶 SDR {receiver.name} `{prober.target}`: `{prober.summary()}`\n" for receiver, prober in sdr_probers
+        )
     bot_latency = round(bot.latency * 1000)
 
     uptime_bot = format_uptime(time.time() - bot_start_time)
@@ -434,7 +2425,7 @@ async def update_stats_message():
 
     content = (
         f"\n📡 **SSTV Stats**\n"
-        f"📶 SDR Ping: `{sdr_ping}`\n"
+        f"{sdr_ping_lines}"
         f"🤖 Bot Ping: `{bot_latency} ms`\n"
         f"📅 **Last SSTV**: `{last_sstv}`\n"
         f"⏰ Bot Uptime: `{uptime_bot}`\n"
@@ -447,98 +2438,224 @@ async def update_stats_message():
         f"• ✅ Approved: {total_approved}\n"
         f"• ❌ Rejected: {total_rejected}"
     )
+    if len(receivers) > 1:
+        per_receiver = sstv_stats["receivers"]
+        content += "\n\n📻 **Receivers** (today · all-time):\n" + "\n".join(
+            "• {}: {} (✅ {} / ❌ {}) · ✅ {} / ❌ {}".format(r.name, *per_receiver.get(r.name, (0, 0, 0, 0, 0)))
+            for r in receivers
+        )
 
+    if content == stats_content:
+        return
     channel = bot.get_channel(STATS_CHANNEL_ID)
     if stats_message is None:
-        messages = [msg async for msg in channel.history(limit=10)]
-        for msg in messages:
-            if msg.author == bot.user:
-                stats_message = msg
-                break
-        if stats_message is None:
-            stats_message = await channel.send(content)
-    else:
-        await stats_message.edit(content=content)
-
-def load_last_sent_datetime():
-    try:
-        with open(LAST_SENT_FILE, "r") as f:
-            data = json.load(f)
-            return datetime.strptime(data["last_sent"], "%Y-%m-%d %H:%M:%S") if "last_sent" in data else None
-    except (FileNotFoundError, json.JSONDecodeError):
-        return None
-
-# Fonction pour sauvegarder la date et l'heure du dernier message envoyé
-def save_last_sent_datetime(last_sent_datetime):
-    try:
-        with open(LAST_SENT_FILE, "w") as f:
-            data = {
-                "last_sent": last_sent_datetime.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            json.dump(data, f)
-    except Exception as e:
-        logging.error(f"Erreur lors de la sauvegarde de la date de dernier envoi: {e}")
-
-# Variable globale pour la dernière date et heure envoyée
-last_sent_datetime = load_last_sent_datetime()
+        stats_message = await find_stats_message(channel)
+    if stats_message is not None:
+        try:
+            await stats_message.edit(content=content)
+            stats_content = content
+            return
+        except discord.NotFound:
+            stats_message = None
+    stats_message = await channel.send(content)
+    stats_content = content
+    runtime_state.set("stats_message", [channel.id, stats_message.id])
+
+async def find_stats_message(channel):
+    saved = runtime_state.get("stats_message")
+    if saved and saved[0] == channel.id:
+        # Pas d'appel API : le message est retrouvé par son ID enregistré
+        return channel.get_partial_message(saved[1])
+    # Bases d'avant runtime_state : on cherche une dernière fois dans l'historique
+    async for msg in channel.history(limit=10):
+        if msg.author == bot.user:
+            runtime_state.set("stats_message", [channel.id, msg.id])
+            return msg
+    return None
 
 @tasks.loop(seconds=10)
+@timed_task
 async def monitor_wspr_file():
-    global last_wspl_lines, last_sent_datetime
+    await process_feeds(wspr_feeds, "monitor_wspr_file")
+
+
+def archive_image(src, dest_dir, fmt):
+    # Exécutée hors de la boucle : pool de processus si recompression, thread sinon
+    os.makedirs(dest_dir, exist_ok=True)
+    name = os.path.basename(src)
+    if fmt == "png":
+        dest = os.path.join(dest_dir, name)
+        shutil.move(src, dest)
+        return dest
+    dest = os.path.join(dest_dir, os.path.splitext(name)[0] + (".jpg" if fmt == "jpeg" else f".{fmt}"))
+    with Image.open(src) as img:
+        img.convert("RGB").save(dest, fmt.upper(), quality=ARCHIVE_QUALITY)
+    os.remove(src)
+    return dest
+
+def remove_file(path):
     try:
-        if not os.path.exists(WSPR_FILE_PATH):
-            return
-
-        with open(WSPR_FILE_PATH, "r") as f:
-            lines = f.readlines()
-
-        lines = [line.strip() for line in lines if line.strip()]
-        new_lines = [line for line in lines if line not in last_wspl_lines]
-        last_wspl_lines = lines[-100:]
-
-        if not new_lines:
-            return
-
-        channel = bot.get_channel(WSPR_CHANNEL_ID)
-        if not channel:
-            return
-
-        for line in new_lines:
-            parts = line.split()
-            if len(parts) >= 6:
-                # Extraire la date et l'heure de la ligne
-                date_time_str = parts[0] + " " + parts[1]  # format: "250411 1750"
-                try:
-                    # Convertir la date et l'heure en objet datetime pour comparaison
-                    message_datetime = datetime.strptime(date_time_str, "%d%m%y %H%M")
-                    
-                    # Vérifier si la date est plus ancienne que celle du dernier message envoyé
-                    if last_sent_datetime and message_datetime <= last_sent_datetime:
-                        continue  # Ignorer le message si sa date est antérieure ou égale
-
-                    # Mettre à jour la dernière date et heure envoyée
-                    last_sent_datetime = message_datetime
-                    save_last_sent_datetime(last_sent_datetime)  # Sauvegarder la nouvelle date
-
-                    # Traitement du message WSPR
-                    callsign = parts[5]  # Call sign dans la ligne
-                    qrz_link = f"https://www.qrz.com/db/{callsign}"  # Lien QRZ pour le call sign
-                    message = (
-                        f"📡 Nouveau message WSPR reçu :\n"
-                        f"```{line}```\n"
-                        f"🔗 QRZ : [**{callsign}**]({qrz_link})"  # Call sign cliquable
-                    )
-                    await channel.send(message)  # Envoi du message formaté
-                except ValueError:
-                    logging.error(f"Erreur de format de date dans la ligne WSPR: {line}")
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def archive_posted_images():
+    # Images postées (en attente ou approuvées) -> ARCHIVE_DIR/<récepteur>/AAAA/MM/JJ/
+    if not ARCHIVE_DIR:
+        return 0
+    fmt = ARCHIVE_FORMAT if Image is not None else "png"
+    executor = get_image_pool() if fmt != "png" else None
+    loop = asyncio.get_running_loop()
+    cutoff = (datetime.now() - timedelta(hours=ARCHIVE_AFTER_HOURS)).strftime('%Y-%m-%d %H:%M:%S')
+    names = list(receivers_by_name)
+    archived = 0
+    while True:
+        rows = await db.fetchall(
+            "SELECT id, filename, timestamp, receiver FROM sstv_events "
+            "WHERE stored_path IS NULL AND message_id IS NOT NULL AND validated IS NOT 0 AND timestamp < ? "
+            f"AND receiver IN ({','.join('?' * len(names))}) ORDER BY id LIMIT ?",
+            (cutoff, *names, RETENTION_BATCH)
+        )
+        for event_id, filename, timestamp, receiver_name in rows:
+            receiver = receivers_by_name[receiver_name]
+            src = os.path.join(receiver.watched_folder, filename)
+            dest_dir = os.path.join(ARCHIVE_DIR, receiver.name, timestamp[:4], timestamp[5:7], timestamp[8:10])
+            try:
+                dest = await loop.run_in_executor(executor, archive_image, src, dest_dir, fmt)
+                archived += 1
+            except FileNotFoundError:
+                dest = ""  # déjà supprimée par OpenWebRX
+            await db.execute("UPDATE sstv_events SET stored_path = ? WHERE id = ?", (dest, event_id))
+        if len(rows) < RETENTION_BATCH:
+            return archived
+
+async def delete_rejected_images():
+    if not REJECTED_RETENTION_DAYS:
+        return 0
+    loop = asyncio.get_running_loop()
+    cutoff = (datetime.now() - timedelta(days=REJECTED_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+    deleted = 0
+    while True:
+        rows = await db.fetchall(
+            "SELECT id, filename, receiver, stored_path FROM sstv_events "
+            "WHERE validated = 0 AND (stored_path IS NULL OR stored_path != '') AND timestamp < ? ORDER BY id LIMIT ?",
+            (cutoff, RETENTION_BATCH)
+        )
+        for event_id, filename, receiver_name, stored_path in rows:
+            path = stored_path
+            if path is None and receiver_name in receivers_by_name:
+                path = os.path.join(receivers_by_name[receiver_name].watched_folder, filename)
+            if path:
+                await loop.run_in_executor(None, remove_file, path)
+            await db.execute("UPDATE sstv_events SET stored_path = '' WHERE id = ?", (event_id,))
+        deleted += len(rows)
+        if len(rows) < RETENTION_BATCH:
+            return deleted
+
+async def delete_in_chunks(sql, params):
+    # Par tranches de RETENTION_BATCH lignes pour ne pas bloquer les autres écritures
+    total = 0
+    while True:
+        count = await db.execute(sql, (*params, RETENTION_BATCH))
+        total += count
+        if count < RETENTION_BATCH:
+            return total
+
+def stale_seen_files(rows, folders):
+    # Entrées hors fenêtre dont le fichier n'est plus dans aucun dossier surveillé :
+    # celles des fichiers encore présents doivent rester, sinon ils seraient repostés
+    stale = []
+    for filename, inode, mtime in rows:
+        for folder in folders:
+            try:
+                if os.stat(os.path.join(folder, filename)).st_ino == inode:
+                    break
+            except FileNotFoundError:
+                continue
+        else:
+            stale.append((filename, inode, mtime))
+    return stale
+
+async def prune_old_rows():
+    # Pas de trigger DELETE : les agrégats sstv_daily_stats, sstv_totals et sstv_receiver_stats
+    # gardent les événements supprimés
+    pruned = {}
+    if EVENT_RETENTION_DAYS:
+        cutoff = (datetime.now() - timedelta(days=EVENT_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+        pruned["sstv_events"] = await delete_in_chunks(
+            "DELETE FROM sstv_events WHERE id IN (SELECT id FROM sstv_events WHERE timestamp < ? LIMIT ?)", (cutoff,)
+        )
+    if SPOT_RETENTION_DAYS:
+        cutoff = int((datetime.now() - timedelta(days=SPOT_RETENTION_DAYS)).strftime('%y%m%d%H%M%S'))
+        pruned["decoded_spots"] = await delete_in_chunks(
+            "DELETE FROM decoded_spots WHERE id IN (SELECT id FROM decoded_spots WHERE stamp < ? LIMIT ?)", (cutoff,)
+        )
+    pruned["image_hashes"] = await delete_in_chunks(
+        "DELETE FROM image_hashes WHERE event_id IN (SELECT event_id FROM image_hashes WHERE created < ? LIMIT ?)",
+        (time.time() - DEDUP_WINDOW_HOURS * 3600,)
+    )
+    rows = await db.fetchall(
+        "SELECT filename, inode, mtime FROM seen_files WHERE seen_at < ?", (time.time() - SEEN_WINDOW_DAYS * 86400,)
+    )
+    folders = [r.watched_folder for r in receivers]
+    stale = await asyncio.get_running_loop().run_in_executor(None, stale_seen_files, rows, folders)
+    for start in range(0, len(stale), RETENTION_BATCH):
+        chunk = stale[start:start + RETENTION_BATCH]
+        await db.run(lambda conn: conn.executemany(
+            "DELETE FROM seen_files WHERE filename = ? AND inode = ? AND mtime = ?", chunk
+        ))
+    pruned["seen_files"] = len(stale)
+    return pruned
+
+def enable_incremental_vacuum(conn):
+    # Une seule fois : auto_vacuum ne change qu'après un VACUUM complet
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
 
+def incremental_vacuum_step(conn, pages):
+    if conn.in_transaction:
+        conn.commit()
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+    return min(free, pages)
+
+async def incremental_vacuum(pages=1000):
+    # Sur le thread SQLite, par petites étapes entre lesquelles les autres requêtes passent
+    if await db.run(enable_incremental_vacuum):
+        logging.info("sstv_stats.db convertie en auto_vacuum incrémental")
+        return 0
+    freed = 0
+    while True:
+        step = await db.run(lambda conn: incremental_vacuum_step(conn, pages))
+        freed += step
+        if step < pages:
+            return freed
+
+@tasks.loop(hours=RETENTION_INTERVAL_HOURS)
+@timed_task
+async def retention_job():
+    try:
+        archived = await archive_posted_images()
+        deleted = await delete_rejected_images()
+        pruned = await prune_old_rows()
+        freed = await incremental_vacuum()
+        logging.info(
+            f"Rétention : {archived} image(s) archivée(s), {deleted} rejetée(s) supprimée(s), "
+            f"lignes purgées {pruned}, {freed} page(s) libérée(s)"
+        )
     except Exception as e:
-        logging.error(f"Erreur dans monitor_wspr_file: {e}")
-
+        logging.error(f"Erreur dans retention_job: {e}", exc_info=True)
 
 @bot.tree.command(name="refreshstats", description="Force update the stats message")
 async def refreshstats(interaction: discord.Interaction):
+    global stats_content
     await interaction.response.send_message("🔄 Refreshing stats...", ephemeral=True)
+    stats_content = None  # édition forcée même si le contenu n'a pas changé
     await update_stats_message()
     await interaction.edit_original_response(content="✅ Stats updated.")
 
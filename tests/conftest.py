@@ -0,0 +1,13 @@
+# Les tests importent le vrai detect_sstv dans un dossier temporaire (voir bench_common.load_bot)
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_common import load_bot
+
+@pytest.fixture(scope="session")
+def bot_module(tmp_path_factory):
+    return load_bot(str(tmp_path_factory.mktemp("sstv")))
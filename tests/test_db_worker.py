@@ -0,0 +1,39 @@
+# Le thread SQLite ne doit pas bloquer la boucle asyncio, même sous un flot d'écritures
+import asyncio
+import time
+
+MAX_LOOP_LAG_P99 = 0.005
+
+async def measure_lag(stop, lags, interval=0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+def test_write_flood_keeps_loop_responsive(bot_module):
+    db = bot_module.db
+    db.call(lambda conn: conn.execute("CREATE TABLE IF NOT EXISTS flood (id INTEGER PRIMARY KEY, payload TEXT)"))
+
+    async def flood(writers=50, writes=400):
+        stop = asyncio.Event()
+        lags = []
+        monitor = asyncio.create_task(measure_lag(stop, lags))
+
+        async def writer(n):
+            for i in range(writes):
+                await db.execute("INSERT INTO flood (payload) VALUES (?)", (f"{n}-{i}" * 8,))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(writer(n) for n in range(writers)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        return lags, elapsed
+
+    lags, elapsed = asyncio.run(flood())
+    count = db.call(lambda conn: conn.execute("SELECT COUNT(*) FROM flood").fetchone()[0])
+    assert count == 50 * 400
+    assert len(lags) > 10
+    p99 = sorted(lags)[int(0.99 * (len(lags) - 1))]
+    assert p99 < MAX_LOOP_LAG_P99, f"lag p99 {p99 * 1000:.1f} ms, max {max(lags) * 1000:.1f} ms en {elapsed:.1f} s"
@@ -0,0 +1,55 @@
+# Sonde TCP contre un serveur local, puis le même port une fois le serveur arrêté
+import asyncio
+import re
+import socket
+
+import pytest
+
+@pytest.mark.parametrize("target, expected", [
+    ("websdr.local", ("websdr.local", None)),
+    ("websdr.local:8073", ("websdr.local", 8073)),
+    ("192.168.1.10:8073", ("192.168.1.10", 8073)),
+    ("[::1]:8073", ("::1", 8073)),
+    ("[fe80::1]", ("fe80::1", None)),
+    ("::1", ("::1", None)),
+    ("fe80::1:8073", ("fe80::1:8073", None)),
+])
+def test_parse_target(bot_module, target, expected):
+    prober = bot_module.HostProber(target)
+    assert (prober.host, prober.port) == expected
+
+def ipv6_available():
+    try:
+        with socket.socket(socket.AF_INET6) as s:
+            s.bind(("::1", 0))
+        return True
+    except OSError:
+        return False
+
+async def probe_up_then_down(prober_cls, host, probes=10):
+    server = await asyncio.start_server(lambda r, w: w.close(), host, 0)
+    port = server.sockets[0].getsockname()[1]
+    target = f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+    prober = prober_cls(target, history=2 * probes)
+    up = [await prober.probe() for _ in range(probes)]
+    up_summary = prober.summary()
+    server.close()
+    await server.wait_closed()
+    down = [await prober.probe() for _ in range(probes)]
+    return up, up_summary, down, prober.summary()
+
+@pytest.mark.parametrize("host", [
+    "127.0.0.1",
+    pytest.param("::1", marks=pytest.mark.skipif(not ipv6_available(), reason="pas d'IPv6 local")),
+])
+def test_probe_local_server(bot_module, host):
+    up, up_summary, down, down_summary = asyncio.run(probe_up_then_down(bot_module.HostProber, host))
+
+    assert all(rtt is not None and 0 <= rtt < 1000 for rtt in up)
+    p50, p95 = map(float, re.search(r"p50 ([\d.]+) / p95 ([\d.]+) ms", up_summary).groups())
+    assert p50 <= p95
+    assert up_summary.endswith("loss 0%)")
+
+    assert down == [None] * len(down)
+    assert down_summary.startswith("unreachable")
+    assert "loss 50%" in down_summary
@@ -0,0 +1,24 @@
+# Un post rejeté ne doit plus servir d'original aux quasi-doublons, ni en mémoire ni après un redémarrage
+import asyncio
+
+def test_rejected_post_is_no_longer_an_original(bot_module):
+    index = bot_module.ImageHashIndex(bot_module.db)
+    phash = 0x0F0F_0F0F_0F0F_0F0F
+
+    async def scenario():
+        await index.add(9001, phash, 5001, "default")
+        await index.add(9002, phash ^ 1, 5001, "default")  # quasi-doublon posté en réponse à 5001
+        await index.add(9003, ~phash, 5003, "default")
+        found = index.find_duplicate(phash ^ 2, "default")
+        await index.remove(9001, 5001)
+        return found, index.find_duplicate(phash ^ 2, "default")
+
+    before, after = asyncio.run(scenario())
+    assert before == 5001
+    assert after is None
+    assert index.find_duplicate(~phash, "default") == 5003
+
+    reloaded = bot_module.ImageHashIndex(bot_module.db)
+    reloaded.load_recent()
+    assert reloaded.find_duplicate(phash ^ 2, "default") is None
+    assert reloaded.find_duplicate(~phash, "default") == 5003
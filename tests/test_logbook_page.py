@@ -0,0 +1,37 @@
+# Pagination /infosear : mêmes pages en avant et en arrière, avec FTS5 comme avec LIKE
+import sqlite3
+
+import pytest
+
+def browse(d, conn, query, limit=7):
+    pages, page = [], d.fetch_logbook_page(conn, "ft", query, limit=limit)
+    while page:
+        pages.append([key for key, _ in page])
+        page = d.fetch_logbook_page(conn, "ft", query, after=page[-1][0], limit=limit)
+    back, first = [], pages[-1][0]
+    while True:
+        page = d.fetch_logbook_page(conn, "ft", query, before=first, limit=limit)
+        if not page:
+            break
+        keys = [key for key, _ in reversed(page)]
+        back.append(keys)
+        first = keys[0]
+    return pages, back
+
+@pytest.mark.parametrize("fts", [True, False])
+def test_pages_follow_id_order(bot_module, tmp_path, monkeypatch, fts):
+    if fts and not bot_module.FTS5_AVAILABLE:
+        pytest.skip("SQLite sans FTS5")
+    monkeypatch.setattr(bot_module, "FTS5_AVAILABLE", fts)
+    conn = sqlite3.connect(str(tmp_path / "data.db"))
+    bot_module.migrate_user_db(conn)
+    conn.executemany(
+        "INSERT INTO ft_messages (type, date, call, reste) VALUES ('8', '2024-01-01', ?, ?)",
+        [(f"F4A{i:02d}" if i % 3 == 0 else f"DL{i:02d}", "CQ JN18") for i in range(60)]
+    )
+    pages, back = browse(bot_module, conn, "F4A")
+    ids = [key for page in pages for key in page]
+    assert ids == sorted(ids) and len(ids) == 20
+    assert [len(page) for page in pages] == [7, 7, 6]
+    assert [key for page in reversed(back) for key in page] == ids[:len(ids) - len(pages[-1])]
+    conn.close()
@@ -0,0 +1,40 @@
+# Endpoint de métriques optionnel et comptage des 429 remontés par les logs de discord.py
+import asyncio
+import logging
+import socket
+
+def ratelimits(d, scope):
+    return d.DISCORD_RATELIMITS.values.get((("scope", scope),), 0)
+
+def log_429(handler, is_global):
+    # Même séquence que discord.http pour une réponse 429
+    log = logging.getLogger("discord.http")
+    handler.handle(log.makeRecord(log.name, logging.WARNING, __file__, 0,
+        "We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.", ("POST", "/x", 1.5), None))
+    if is_global:
+        handler.handle(log.makeRecord(log.name, logging.WARNING, __file__, 0,
+            "Global rate limit has been hit. Retrying in %.2f seconds.", (1.5,), None))
+
+def test_global_429_is_counted_once(bot_module):
+    handler = bot_module.RateLimitLogHandler(logging.WARNING)
+    route, glob = ratelimits(bot_module, "route"), ratelimits(bot_module, "global")
+
+    async def scenario():
+        log_429(handler, is_global=False)
+        log_429(handler, is_global=True)
+        log_429(handler, is_global=False)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert ratelimits(bot_module, "route") == route + 2
+    assert ratelimits(bot_module, "global") == glob + 1
+
+def test_metrics_port_in_use_does_not_raise(bot_module, monkeypatch, caplog):
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        monkeypatch.setattr(bot_module, "METRICS_HOST", "127.0.0.1")
+        monkeypatch.setattr(bot_module, "METRICS_PORT", busy.getsockname()[1])
+        asyncio.run(bot_module.start_metrics_server())
+    assert bot_module.metrics_runner is None
+    assert "Serveur de métriques non démarré" in caplog.text
@@ -0,0 +1,39 @@
+# Scan périodique d'un gros dossier : seuls les nouveaux noms coûtent un stat et une requête
+import asyncio
+import os
+import time
+
+def test_unseen_only_checks_new_names(bot_module, tmp_path, monkeypatch):
+    index = bot_module.SeenFileIndex(bot_module.db, capacity=10)
+    folder = str(tmp_path)
+    old = [f"SSTV-old-{i:04d}.png" for i in range(200)]
+    for name in old:
+        (tmp_path / name).write_bytes(b"x")
+    rows = [index.file_key(folder, name) + (time.time(),) for name in old]
+    bot_module.db.call(lambda conn: conn.executemany(
+        "INSERT OR REPLACE INTO seen_files (filename, inode, mtime, seen_at) VALUES (?, ?, ?, ?)", rows
+    ))
+
+    stats, queries = [], []
+    file_key, run = index.file_key, index.db.run
+    monkeypatch.setattr(index, "file_key", lambda f, n: stats.append(n) or file_key(f, n))
+    monkeypatch.setattr(index.db, "run", lambda fn: queries.append(fn) or run(fn))
+
+    async def scan():
+        return await index.unseen(folder, sorted(os.listdir(folder)))
+
+    # Premier scan : tout est stat()é, les 200 anciens confirmés par une seule requête
+    assert asyncio.run(scan()) == []
+    assert len(stats) == 200 and len(queries) == 1
+
+    (tmp_path / "SSTV-new-1.png").write_bytes(b"x")
+    (tmp_path / old[0]).unlink()
+    stats.clear(), queries.clear()
+    assert asyncio.run(scan()) == ["SSTV-new-1.png"]
+    assert stats == ["SSTV-new-1.png"] and len(queries) == 1
+
+    asyncio.run(index.add(folder, "SSTV-new-1.png"))
+    stats.clear(), queries.clear()
+    assert asyncio.run(scan()) == []
+    assert stats == [] and queries == []
+    assert len(index.confirmed[folder]) == 200
@@ -0,0 +1,29 @@
+# Spots enregistrés mais pas encore publiés dans le résumé : republiés après un redémarrage
+import asyncio
+
+def make_feed(d, path):
+    digest = d.SpotDigest("WSPR", d.format_wspr_digest_line)
+    return d.DecoderFeed("digest-test:wspr", str(path), d.parse_wspr_line, 1, d.format_wspr_spot, digest, "digest-test")
+
+def test_pending_digest_survives_restart(bot_module, tmp_path):
+    d = bot_module
+    path = tmp_path / "ALL_WSPR.TXT"
+    path.write_text("")
+    feed = make_feed(d, path)
+    assert feed.digest.spots == []
+
+    path.write_text("".join(f"240101 1200 -12  0.1  14.0971{i:02d} F4A{i:02d} JN18 37\n" for i in range(5)))
+    spots, cursor = feed.read_batch()
+    asyncio.run(feed.commit_batch(spots, cursor))
+    feed.digest.add(spots)
+    assert [s.id for s in spots] == list(range(spots[0].id, spots[0].id + 5))
+
+    # Arrêt avant la publication : le nouveau flux retrouve les 5 spots en attente
+    restarted = make_feed(d, path)
+    assert [s.call for s in restarted.digest.spots] == [f"F4A{i:02d}" for i in range(5)]
+    assert restarted.read_batch()[0] == []
+
+    embed, posted_id = restarted.digest.flush()
+    assert embed is not None and posted_id == spots[-1].id
+    restarted.mark_posted(posted_id)
+    assert make_feed(d, path).digest.spots == []
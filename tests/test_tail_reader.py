@@ -0,0 +1,75 @@
+# Lecture plafonnée par tour : un arriéré est rendu en plusieurs passages, sans perte ni doublon
+import asyncio
+import json
+import os
+
+import pytest
+
+def make_reader(bot_module, tmp_path, content, cap):
+    path = tmp_path / "ALL.TXT"
+    path.write_bytes(content)
+    reader = bot_module.TailReader(str(path), bot_module.runtime_state)
+    reader.inode, reader.offset = os.stat(path).st_ino, 0
+    reader.MAX_READ_BYTES = cap
+    return path, reader
+
+def read_pass(reader):
+    # Un passage suivi de l'enregistrement du curseur, comme après commit_batch
+    lines = list(reader.read_new_lines())
+    reader.advance(reader.next_cursor)
+    return lines
+
+def test_backlog_is_read_over_several_passes(bot_module, tmp_path):
+    lines = [f"line {i:04d}" for i in range(1000)]
+    _, reader = make_reader(bot_module, tmp_path, "".join(l + "\n" for l in lines).encode(), cap=1000)
+    passes = []
+    while True:
+        batch = read_pass(reader)
+        if not batch:
+            break
+        passes.append(batch)
+    assert len(passes) > 5
+    assert all(len(batch) <= 100 for batch in passes)
+    assert [line for batch in passes for line in batch] == lines
+
+def test_oversized_line_is_skipped(bot_module, tmp_path):
+    path, reader = make_reader(bot_module, tmp_path, b"x" * 5000 + b"\nok 1\n", cap=1000)
+    read = []
+    for _ in range(10):
+        read.extend(read_pass(reader))
+    assert read[-1] == "ok 1"
+    assert reader.offset == os.path.getsize(path)
+
+def test_partial_last_line_waits_for_newline(bot_module, tmp_path):
+    path, reader = make_reader(bot_module, tmp_path, b"done\npart", cap=1000)
+    assert read_pass(reader) == ["done"]
+    with open(path, "ab") as f:
+        f.write(b"ial\n")
+    assert read_pass(reader) == ["partial"]
+
+def test_failed_store_rereads_the_same_lines(bot_module, tmp_path, monkeypatch):
+    path = tmp_path / "ALL_WSPR.TXT"
+    path.write_text("")
+    feed = bot_module.DecoderFeed("test-wspr", str(path), bot_module.parse_wspr_line, 1, None, None)
+    path.write_text("240101 1200 -12  0.1  14.097100 F4ABC JN18 37\n")
+    high_water, cursor = feed.high_water, [feed.reader.inode, feed.reader.offset]
+
+    async def failing_run(fn):
+        raise OSError("disque plein")
+
+    spots, new_cursor = feed.read_batch()
+    assert len(spots) == 1 and new_cursor != cursor
+    monkeypatch.setattr(bot_module.db, "run", failing_run)
+    with pytest.raises(OSError):
+        asyncio.run(feed.commit_batch(spots, new_cursor))
+    assert [feed.reader.inode, feed.reader.offset] == cursor
+    assert feed.high_water == high_water
+    monkeypatch.undo()
+
+    spots, new_cursor = feed.read_batch()
+    assert [s.call for s in spots] == ["F4ABC"]
+    asyncio.run(feed.commit_batch(spots, new_cursor))
+    assert [feed.reader.inode, feed.reader.offset] == new_cursor
+    assert bot_module.db.call(lambda conn: conn.execute(
+        "SELECT value FROM runtime_state WHERE key = ?", (feed.reader.key,)
+    ).fetchone())[0] == json.dumps(new_cursor)
@@ -0,0 +1,49 @@
+# Pool de bases privées sous charge : beaucoup plus d'utilisateurs que de connexions ouvertes,
+# avec évictions et fermetures concurrentes pendant les écritures
+import asyncio
+import os
+
+USERS = 200
+INSERTS_PER_USER = 5
+
+def test_concurrent_users_with_evictions(bot_module):
+    pool = bot_module.UserDBPool(capacity=4, max_workers=16)
+    for user in range(USERS):
+        os.makedirs(pool.db_path(f"load{user}").rsplit(os.sep, 1)[0], exist_ok=True)
+
+    def insert(user, i):
+        return lambda conn: conn.execute(
+            "INSERT INTO ft_messages (type, date, call, reste) VALUES ('FT8', ?, ?, '')", (f"2024-01-01 {i}", f"LOAD{user}")
+        ).rowcount
+
+    async def churn(stop):
+        # Fermetures forcées en parallèle des écritures, comme evict_idle_user_dbs et /deleteall
+        n = 0
+        while not stop.is_set():
+            await pool.evict_idle(0)
+            await pool.close(f"load{n % USERS}")
+            n += 1
+            await asyncio.sleep(0)
+
+    async def load():
+        stop = asyncio.Event()
+        churner = asyncio.create_task(churn(stop))
+        results = await asyncio.gather(
+            *(pool.run(f"load{user}", insert(user, i), create=True)
+              for i in range(INSERTS_PER_USER) for user in range(USERS)),
+            return_exceptions=True
+        )
+        stop.set()
+        await churner
+        counts = await asyncio.gather(*(
+            pool.run(f"load{user}", lambda conn: conn.execute("SELECT COUNT(*) FROM ft_messages").fetchone()[0])
+            for user in range(USERS)
+        ))
+        return results, counts
+
+    results, counts = asyncio.run(load())
+    failures = [r for r in results if isinstance(r, BaseException)]
+    assert not failures, f"{len(failures)} échecs sur {len(results)}, ex. {failures[0]!r}"
+    assert counts == [INSERTS_PER_USER] * USERS
+    assert len(pool.entries) <= pool.capacity
+    pool.executor.shutdown()